@@ -0,0 +1,369 @@
+# benchmark.py
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from converter import VIDEO_BACKENDS, get_ffmpeg_exe
+from copier import COPY_MODES
+from scheduler import JOB_KINDS, plan_jobs, run_jobs, scan_files
+
+REPORT_VERSION = 1
+# Wall time differences below this many seconds are never reported as regressions
+DEFAULT_MIN_DELTA = 0.25
+
+# Synthetic corpus. Every entry is generated locally, so runs are offline and
+# the same settings always produce the same files.
+VIDEO_SPECS = [
+    # (extension, width, height, seconds, fps)
+    ("mp4", 320, 240, 2, 15),
+    ("mp4", 640, 480, 4, 30),
+    ("mp4", 1280, 720, 3, 30),
+    ("webm", 640, 360, 3, 24),
+    ("mov", 480, 270, 5, 25),
+]
+WEBP_SPECS = [
+    # (width, height, frames, frame duration in ms); 1 frame = static
+    (512, 512, 1, 0),
+    (1024, 768, 1, 0),
+    (320, 240, 40, 50),
+    (480, 360, 150, 40),
+    (800, 600, 300, 33),
+]
+IMAGE_SPECS = [
+    # (extension, width, height)
+    ("jpg", 1920, 1080),
+    ("jpg", 4000, 3000),
+    ("png", 800, 600),
+    ("png", 1600, 1200),
+]
+
+
+def _generate_video(ffmpeg_exe, path, width, height, seconds, fps):
+    codec = ["-c:v", "libvpx-vp9", "-b:v", "1M"] if path.endswith(".webm") else ["-pix_fmt", "yuv420p"]
+    subprocess.run(
+        [ffmpeg_exe, "-v", "error", "-nostdin", "-y",
+         "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+         *codec, path],
+        check=True,
+    )
+
+
+def _noise(width, height, spread, rng):
+    """
+    Grey noise around mid-grey, +-`spread`, drawn from `rng` so it is
+    reproducible (`Image.effect_noise` uses its own unseeded generator).
+    """
+    from PIL import Image
+
+    noise = Image.frombytes("L", (width, height), rng.randbytes(width * height))
+    return noise.point(lambda value: 128 + (value - 128) * spread // 128).convert("RGB")
+
+
+def _generate_webp(path, width, height, frames, duration, rng):
+    from PIL import ImageDraw
+
+    background = _noise(width, height, 48, rng)
+    images = []
+    for index in range(frames):
+        frame = background.copy()
+        draw = ImageDraw.Draw(frame)
+        # A few moving shapes plus runs of repeated frames, like real stickers
+        for shape in range(3):
+            x = (index * (7 + shape * 5) + shape * width // 3) % max(width - 60, 1)
+            y = (shape * height // 4 + index * 3) % max(height - 60, 1)
+            draw.ellipse([x, y, x + 60, y + 60], fill=(rng.randrange(256), 80 * shape, 200))
+        images.append(frame)
+        if frames > 1 and index % 10 == 9:
+            images.append(frame.copy())
+
+    if frames == 1:
+        images[0].save(path, format="WEBP", quality=80)
+    else:
+        images[0].save(path, format="WEBP", save_all=True, append_images=images[1:],
+                       duration=duration, loop=0, quality=70)
+
+
+def _generate_image(path, width, height, rng):
+    image = _noise(width, height, 64, rng)
+    if path.endswith(".jpg"):
+        image.save(path, quality=90)
+    else:
+        image.save(path)
+
+
+def _file_rng(seed, path, corpus_dir):
+    # One generator per file, so reusing part of a corpus doesn't shift the rest
+    return random.Random(f"{seed}:{os.path.relpath(path, corpus_dir)}")
+
+
+def generate_corpus(corpus_dir, copies=1, seed=0):
+    """
+    Write the synthetic media corpus to `corpus_dir`.
+
+    Files that already exist are kept, so a corpus can be reused between runs.
+
+    Args:
+        corpus_dir (str): Folder to write into.
+        copies (int): How many times every spec is repeated, to vary file count.
+        seed (int): Seed for the random parts of the generated images.
+
+    Returns:
+        dict: Description of the corpus for the report.
+    """
+    ffmpeg_exe = get_ffmpeg_exe()
+    if ffmpeg_exe is None:
+        raise RuntimeError("The benchmark needs the ffmpeg binary from imageio-ffmpeg")
+
+    for copy in range(copies):
+        folder = os.path.join(corpus_dir, f"set{copy:03d}")
+        os.makedirs(folder, exist_ok=True)
+        for ext, width, height, seconds, fps in VIDEO_SPECS:
+            path = os.path.join(folder, f"video_{width}x{height}_{seconds}s_{fps}fps.{ext}")
+            if not os.path.exists(path):
+                _generate_video(ffmpeg_exe, path, width, height, seconds, fps)
+        for width, height, frames, duration in WEBP_SPECS:
+            path = os.path.join(folder, f"webp_{width}x{height}_{frames}f.webp")
+            if not os.path.exists(path):
+                _generate_webp(path, width, height, frames, duration, _file_rng(seed, path, corpus_dir))
+        for ext, width, height in IMAGE_SPECS:
+            path = os.path.join(folder, f"image_{width}x{height}.{ext}")
+            if not os.path.exists(path):
+                _generate_image(path, width, height, _file_rng(seed, path, corpus_dir))
+
+    return {
+        "copies": copies,
+        "seed": seed,
+        "videos": VIDEO_SPECS,
+        "webps": WEBP_SPECS,
+        "images": IMAGE_SPECS,
+    }
+
+
+def run_scenario(corpus_dir, work_dir, name, formats, convert_options, workers, copy_workers):
+    """
+    Run the normal scan/plan/convert pipeline over part of the corpus once.
+
+    Returns:
+        dict: Wall time, throughput, byte counts, summed stage times and the
+        highest peak RSS reported with any result (a worker process, or this
+        process for copies, which run on threads).
+    """
+    output_dir = os.path.join(work_dir, name)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    gif_output = os.path.join(output_dir, "output_gifs")
+    img_output = os.path.join(output_dir, "output_images")
+    os.makedirs(gif_output)
+    os.makedirs(img_output)
+
+    start = time.perf_counter()
+    jobs = plan_jobs(scan_files(corpus_dir, formats), gif_output, img_output, "bench",
+                     "benchimage", convert_options=convert_options)
+    files = errors = input_bytes = output_bytes = 0
+    peak_rss = 0
+    stages = {}
+    for result in run_jobs(jobs, workers=workers, copy_workers=copy_workers,
+                           log_file=os.path.join(work_dir, "benchmark.log")):
+        files += 1
+        if result["error"]:
+            errors += 1
+            continue
+        input_bytes += result["input_bytes"] or 0
+        output_bytes += result["output_bytes"] or 0
+        peak_rss = max(peak_rss, result["peak_rss_bytes"] or 0)
+        for stage, seconds in result["stages"].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    wall = time.perf_counter() - start
+
+    return {
+        "wall_seconds": wall,
+        "files": files,
+        "errors": errors,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "files_per_sec": files / wall if wall else 0.0,
+        "mb_per_sec": input_bytes / (1024 * 1024) / wall if wall else 0.0,
+        "peak_rss_bytes": peak_rss,
+        "stage_seconds": stages,
+    }
+
+
+def build_scenarios(backends, worker_counts, copy_modes):
+    video_formats = {ext for ext, kind in JOB_KINDS.items() if kind == "video"}
+    image_formats = {ext for ext, kind in JOB_KINDS.items() if kind == "copy"}
+    scenarios = []
+    for workers in worker_counts:
+        for backend in backends:
+            scenarios.append({
+                "name": f"video-{backend}-w{workers}", "formats": video_formats,
+                "convert_options": {"video": {"backend": backend}},
+                "workers": workers, "copy_workers": 1,
+            })
+        scenarios.append({
+            "name": f"webp-w{workers}", "formats": {"webp"}, "convert_options": {},
+            "workers": workers, "copy_workers": 1,
+        })
+        for mode in copy_modes:
+            scenarios.append({
+                "name": f"copy-{mode}-w{workers}", "formats": image_formats,
+                "convert_options": {"copy": {"mode": mode}},
+                "workers": 1, "copy_workers": workers,
+            })
+    return scenarios
+
+
+def _package_versions():
+    from importlib import metadata
+
+    versions = {}
+    for package in ("moviepy", "Pillow", "numpy", "imageio", "imageio-ffmpeg"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def compare_reports(baseline, current, tolerance, min_delta=DEFAULT_MIN_DELTA):
+    """
+    Print how `current` differs from `baseline` per scenario.
+
+    A scenario only counts as slower when its wall time grew by more than
+    `tolerance` *and* by more than both `min_delta` seconds and the spread
+    of the baseline's own runs, so sub-second scenarios don't fail on noise.
+
+    Returns:
+        list: Names of scenarios that got slower.
+    """
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"{'scenario':<24} {'before':>9} {'after':>9} {'change':>8} {'peak MB':>8}")
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None:
+            print(f"{result['name']:<24} {'-':>9} {result['wall_seconds']:>8.2f}s {'new':>8}")
+            continue
+        change = result["wall_seconds"] / before["wall_seconds"] - 1 if before["wall_seconds"] else 0.0
+        delta = result["wall_seconds"] - before["wall_seconds"]
+        runs = before.get("wall_seconds_all") or [before["wall_seconds"]]
+        flag = ""
+        if change > tolerance and delta > max(min_delta, max(runs) - min(runs)):
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:<24} {before['wall_seconds']:>8.2f}s {result['wall_seconds']:>8.2f}s "
+              f"{change:>+7.0%} {result['peak_rss_bytes'] / 1024 / 1024:>8.0f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the converter on a locally generated media corpus."
+    )
+    parser.add_argument("--corpus-dir", default=None,
+                        help="Where to generate (or reuse) the corpus (default: a temporary folder).")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="Repeat every corpus entry this many times (default: 1).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated images (default: 0).")
+    parser.add_argument("--backends", default=",".join(VIDEO_BACKENDS),
+                        help=f"Video backends to compare (default: {','.join(VIDEO_BACKENDS)}).")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                        help="Comma-separated worker counts (default: 1 and the CPU count).")
+    parser.add_argument("--copy-modes", default="copy,auto",
+                        help=f"Copy modes to compare, from {','.join(COPY_MODES)} (default: copy,auto).")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per scenario; the median wall time is reported (default: 3).")
+    parser.add_argument("--output", default="benchmark_report.json", help="Report file to write.")
+    parser.add_argument("--compare", default=None, help="Earlier report to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed wall time growth before --compare fails (default: 0.15).")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                        help="Ignore wall time growth below this many seconds "
+                             f"(default: {DEFAULT_MIN_DELTA}).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    backends = [b for b in args.backends.split(",") if b]
+    worker_counts = sorted({int(w) for w in args.workers.split(",") if w})
+    copy_modes = [m for m in args.copy_modes.split(",") if m]
+    for value, allowed in ((backends, VIDEO_BACKENDS), (copy_modes, COPY_MODES)):
+        unknown = set(value) - set(allowed)
+        if unknown:
+            print(f"Unknown choice: {', '.join(sorted(unknown))}", file=sys.stderr)
+            return 2
+
+    temp_dir = tempfile.mkdtemp(prefix="converter-bench-")
+    corpus_dir = args.corpus_dir or os.path.join(temp_dir, "corpus")
+    try:
+        print(f"Generating corpus in {corpus_dir} ...")
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            corpus = pool.submit(generate_corpus, corpus_dir, args.copies, args.seed).result()
+
+        results = []
+        for scenario in build_scenarios(backends, worker_counts, copy_modes):
+            runs = []
+            for _ in range(max(args.repeat, 1)):
+                # Each run gets a fresh process: peak RSS is a lifetime high-water
+                # mark, and copies run on threads of the process driving the run
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    runs.append(pool.submit(
+                        run_scenario, corpus_dir, temp_dir, scenario["name"], scenario["formats"],
+                        scenario["convert_options"], scenario["workers"], scenario["copy_workers"],
+                    ).result())
+            median = statistics.median(run["wall_seconds"] for run in runs)
+            run = min(runs, key=lambda r: abs(r["wall_seconds"] - median))
+            result = {"name": scenario["name"], "workers": scenario["workers"],
+                      "copy_workers": scenario["copy_workers"],
+                      "convert_options": scenario["convert_options"],
+                      "wall_seconds_all": [r["wall_seconds"] for r in runs], **run}
+            results.append(result)
+            print(f"{scenario['name']:<24} {run['wall_seconds']:>8.2f}s "
+                  f"{run['files_per_sec']:>8.2f} files/s {run['mb_per_sec']:>8.2f} MB/s "
+                  f"{run['peak_rss_bytes'] / 1024 / 1024:>6.0f} MB peak"
+                  f"{'  ' + str(run['errors']) + ' errors' if run['errors'] else ''}")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    report = {
+        "version": REPORT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "packages": _package_versions(),
+        },
+        "corpus": corpus,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_reports(baseline, report, args.tolerance, args.min_delta)
+        if regressions:
+            print(f"Slower than {args.compare} by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# cli.py
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from converter import DEFAULT_VIDEO_BACKEND, DEFAULT_WEBP_MAX_MEMORY_MB, VIDEO_BACKENDS
+from copier import COPY_MODES, DEFAULT_COPY_MODE
+from manifest import Manifest
+from metrics import EtaEstimator, MetricsWriter
+from profiles import DEFAULT_PROFILE, PROFILES, build_convert_options
+from scheduler import ALL_EXTS, DEFAULT_COPY_WORKERS, plan_jobs, read_ahead, run_jobs, scan_files
+
+ALL_FORMATS = sorted(ALL_EXTS)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert videos and WEBPs to GIFs and copy images without the GUI."
+    )
+    parser.add_argument("-i", "--input", default="input_videos", help="Folder to scan recursively.")
+    parser.add_argument("-o", "--output", default="output", help="Folder for output_gifs/ and output_images/.")
+    parser.add_argument("-p", "--prefix", default="newgif", help="Filename prefix for generated GIFs.")
+    parser.add_argument("--image-prefix", default="newimage", help="Filename prefix for copied images.")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count).")
+    parser.add_argument("--copy-workers", type=int, default=DEFAULT_COPY_WORKERS,
+                        help=f"Number of threads copying images (default: {DEFAULT_COPY_WORKERS}).")
+    parser.add_argument("--copy-mode", choices=COPY_MODES, default=DEFAULT_COPY_MODE,
+                        help="How images are copied: reflink/hardlink when input and output share "
+                             f"a filesystem, otherwise a kernel copy (default: {DEFAULT_COPY_MODE}).")
+    parser.add_argument("--formats", default=",".join(ALL_FORMATS),
+                        help=f"Comma-separated extensions to process (default: {','.join(ALL_FORMATS)}).")
+    parser.add_argument("--profile", choices=PROFILES, default=DEFAULT_PROFILE,
+                        help=f"Size/quality limits for generated GIFs (default: {DEFAULT_PROFILE}).")
+    parser.add_argument("--backend", choices=VIDEO_BACKENDS, default=DEFAULT_VIDEO_BACKEND,
+                        help=f"Video to GIF backend (default: {DEFAULT_VIDEO_BACKEND}).")
+    parser.add_argument("--webp-max-memory", type=int, default=DEFAULT_WEBP_MAX_MEMORY_MB, metavar="MB",
+                        help="Frame memory budget per animated WEBP; frames are dropped to stay within it "
+                             "(default: no budget, keep every frame).")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="Ignore earlier runs: convert everything and number from 0001.")
+    parser.add_argument("--metrics-dir", default=None,
+                        help="Folder for metrics.jsonl and metrics.prom (default: the output folder).")
+    parser.add_argument("--log-file", default="conversion.log", help="Log file path.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the final summary.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the walk/convert/copy pipeline headlessly.
+
+    Returns:
+        int: Process exit code; 1 if the input folder is missing or any file failed.
+    """
+    args = parse_args(argv)
+
+    logging.basicConfig(
+        filename=args.log_file,
+        level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    formats = {ext.strip().lower().lstrip(".") for ext in args.formats.split(",") if ext.strip()}
+    unknown = formats - set(ALL_FORMATS)
+    if unknown:
+        print(f"Unsupported formats: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    if not os.path.isdir(args.input):
+        print(f"Input folder does not exist: {args.input}", file=sys.stderr)
+        logging.error("Input folder does not exist.")
+        return 1
+
+    start_total = time.perf_counter()
+    gif_output = os.path.join(args.output, "output_gifs")
+    img_output = os.path.join(args.output, "output_images")
+    os.makedirs(gif_output, exist_ok=True)
+    os.makedirs(img_output, exist_ok=True)
+
+    manifest = None if args.no_manifest else Manifest(args.output)
+    scan_stats = {}
+    file_paths = read_ahead(scan_files(args.input, formats, scan_stats))
+    jobs = plan_jobs(file_paths, gif_output, img_output, args.prefix,
+                     args.image_prefix, formats=formats,
+                     convert_options=build_convert_options(args.profile, args.backend,
+                                                           args.webp_max_memory, args.copy_mode),
+                     manifest=manifest)
+
+    metrics_writer = MetricsWriter(args.metrics_dir or args.output)
+    eta = EtaEstimator(args.workers, args.copy_workers)
+    processed = failed = skipped = 0
+    try:
+        for result in run_jobs(jobs, workers=args.workers, log_file=args.log_file,
+                               copy_workers=args.copy_workers):
+            processed += 1
+            metrics_writer.record(result)
+            eta.finished(result)
+            job = result["job"]
+            if result["error"]:
+                failed += 1
+                print(f"Error: {job['input_path']}: {result['error']}", file=sys.stderr)
+                continue
+
+            if result["skipped"]:
+                skipped += 1
+            elif manifest:
+                manifest.mark_done(job["input_path"], result.get("content_hash"))
+
+            if not args.quiet:
+                status = f"{job['skip']}" if result["skipped"] else f"{round(result['elapsed'], 2)}s"
+                discovered = f"{scan_stats['discovered']}{'+' if scan_stats['scanning'] else ''}"
+                remaining = round(eta.eta(scan_stats["discovered_bytes"]))
+                print(f"[{processed}/{discovered}] {job['input_path']} -> {job['output_path']} "
+                      f"({status}, ETA {remaining}s)")
+    except KeyboardInterrupt:
+        logging.warning("Conversion cancelled by user.")
+        print("Conversion cancelled.", file=sys.stderr)
+        return 130
+    finally:
+        if manifest:
+            manifest.close()
+        metrics_writer.close()
+
+    total_elapsed = time.perf_counter() - start_total
+    print(f"Processed {processed} files ({skipped} skipped, {failed} failed) "
+          f"in {round(total_elapsed, 2)} seconds.")
+    logging.info(f"Finished conversion in {round(total_elapsed, 2)} seconds")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
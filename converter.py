@@ -1,39 +1,454 @@
 # converter.py
 
+import functools
 import logging
-from moviepy.editor import VideoFileClip
+import os
+import re
+import subprocess
+import tempfile
 from PIL import Image
 
-def convert_video_to_gif(input_path, output_path):
+from metrics import stage
+
+VIDEO_BACKENDS = ("ffmpeg", "moviepy")
+DEFAULT_VIDEO_BACKEND = "ffmpeg"
+# No frame memory budget unless one is asked for; dropping frames changes the animation
+DEFAULT_WEBP_MAX_MEMORY_MB = None
+DEFAULT_WEBP_PALETTE_SAMPLES = 16
+
+# How far each byte-budget attempt shrinks the output, and when to give up
+BUDGET_ATTEMPTS = 8
+BUDGET_SCALE_STEP = 0.8
+BUDGET_MIN_SCALE_STEP = 0.5
+BUDGET_FPS_STEP = 0.85
+BUDGET_MIN_COLORS = 32
+
+def fit_size(width, height, max_width=None, max_height=None, scale=1.0):
+    """
+    Return the output (width, height) for a source size, never upscaling.
+
+    Args:
+        width (int): Source width in pixels.
+        height (int): Source height in pixels.
+        max_width (int): Largest allowed output width.
+        max_height (int): Largest allowed output height.
+        scale (float): Extra factor applied after the limits.
+    """
+    factor = 1.0
+    if max_width:
+        factor = min(factor, max_width / width)
+    if max_height:
+        factor = min(factor, max_height / height)
+    factor *= scale
+    return max(1, round(width * factor)), max(1, round(height * factor))
+
+def fit_fps(source_fps, fps=None, fps_scale=1.0):
+    """
+    Return the output frame rate: `source_fps` capped at `fps`, times `fps_scale`.
+    """
+    target = min(source_fps, fps) if fps else source_fps
+    return target * fps_scale
+
+def fit_to_budget(write, output_path, max_bytes=None, colors=None):
+    """
+    Call `write` with smaller settings until the file it writes fits `max_bytes`.
+
+    Every attempt that is still too large scales the frame size down (more
+    the further it is over budget), lowers the frame rate and reduces the
+    colour count, up to `BUDGET_ATTEMPTS` times. The last attempt is kept
+    even if it is still over budget.
+
+    Args:
+        write (callable): Writes `output_path`; called with `scale`,
+            `fps_scale` and `colors` keyword arguments.
+        output_path (str): File written by `write`.
+        max_bytes (int): Size budget. None writes once with the given settings.
+        colors (int): Starting palette size. Defaults to 256.
+    """
+    scale = fps_scale = 1.0
+    colors = colors or 256
+    for attempt in range(1, BUDGET_ATTEMPTS + 1):
+        write(scale=scale, fps_scale=fps_scale, colors=colors)
+        size = os.path.getsize(output_path)
+        if not max_bytes or size <= max_bytes:
+            return
+        logging.info(f"{output_path} is {size} bytes, over the {max_bytes} byte budget (attempt {attempt})")
+        # GIF size grows roughly with pixel count, so far-over files shrink faster
+        scale *= max(BUDGET_MIN_SCALE_STEP, min(BUDGET_SCALE_STEP, (max_bytes / size) ** 0.5))
+        fps_scale *= BUDGET_FPS_STEP
+        colors = max(BUDGET_MIN_COLORS, colors * 3 // 4)
+    logging.warning(f"Could not fit {output_path} into {max_bytes} bytes; keeping {size} bytes")
+
+def get_ffmpeg_exe():
+    """
+    Return the ffmpeg binary bundled with imageio-ffmpeg, or None if unavailable.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception as e:
+        logging.warning(f"ffmpeg not available, falling back to MoviePy: {e}")
+        return None
+
+def probe_video(ffmpeg_exe, input_path):
+    """
+    Return (width, height, fps) of the first video stream, read from ffmpeg's banner.
+
+    The size is the displayed one: ffmpeg autorotates, so width and height
+    are swapped for streams rotated by 90 or 270 degrees (portrait phone videos).
+    """
+    result = subprocess.run([ffmpeg_exe, "-hide_banner", "-nostdin", "-i", input_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode(errors="replace")
+    stream = re.search(r"Stream #.*?Video: .*", info)
+    size = re.search(r", (\d{2,})x(\d{2,})", stream.group(0)) if stream else None
+    if not size:
+        raise RuntimeError(f"ffmpeg found no video stream in {input_path}")
+    rate = re.search(r"([\d.]+) (?:fps|tbr)", stream.group(0))
+    width, height = int(size.group(1)), int(size.group(2))
+
+    # Rotation is listed under the stream as side data (ffmpeg 6+) or metadata
+    details = info[stream.end():].split("Stream #", 1)[0]
+    rotation = re.search(r"rotation of (-?[\d.]+) degrees|rotate\s*:\s*(-?\d+)", details)
+    if rotation and round(float(rotation.group(1) or rotation.group(2))) % 180 == 90:
+        width, height = height, width
+    return width, height, float(rate.group(1)) if rate else 25.0
+
+def _run_ffmpeg(args):
+    result = subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        message = result.stderr.decode(errors="replace").strip().splitlines()
+        raise RuntimeError(f"ffmpeg failed: {message[-1] if message else result.returncode}")
+
+def ffmpeg_video_to_gif(ffmpeg_exe, input_path, output_path, max_width=None, max_height=None,
+                        fps=None, max_duration=None, colors=None, scale=1.0, fps_scale=1.0, timer=None):
     """
-    Convert a video file (.mp4, .webm, .mov) to a GIF using MoviePy.
+    Convert a video to a GIF with ffmpeg's palettegen/paletteuse filters.
+
+    A global palette can only be built once every frame has been seen, so
+    doing it in a single filter graph makes ffmpeg buffer the whole clip.
+    Instead the clip is streamed twice: once into palettegen, then through
+    paletteuse against that palette. Memory stays flat for any clip length
+    and no frame is ever decoded into Python.
 
     Args:
+        ffmpeg_exe (str): Path to the ffmpeg binary.
         input_path (str): Full path to the input video file.
         output_path (str): Full path to the output GIF file.
+        max_width (int): Largest output width; the aspect ratio is kept.
+        max_height (int): Largest output height.
+        fps (float): Frame rate cap. Defaults to the source frame rate.
+        max_duration (float): Only convert the first this many seconds.
+        colors (int): Palette size, up to 256.
+        scale (float): Extra size factor, used by the byte-budget search.
+        fps_scale (float): Extra frame rate factor, used by the byte-budget search.
+        timer (StageTimer): Records "probe", "quantize" (decode + palettegen)
+            and "write" (decode + paletteuse + GIF encode) times.
     """
+    base = [ffmpeg_exe, "-v", "error", "-nostdin", "-y"]
+    if max_duration:
+        base += ["-t", str(max_duration)]
+
+    with stage(timer, "probe"):
+        source_width, source_height, source_fps = probe_video(ffmpeg_exe, input_path)
+    width, height = fit_size(source_width, source_height, max_width, max_height, scale)
+    target_fps = fit_fps(source_fps, fps, fps_scale)
+    filters = []
+    if target_fps < source_fps:
+        filters.append(f"fps={round(target_fps, 3)}")
+    if (width, height) != (source_width, source_height):
+        filters.append(f"scale={width}:{height}:flags=lanczos")
+    prefix = "".join(f"{f}," for f in filters)
+
+    fd, palette_path = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(output_path) or None)
+    os.close(fd)
     try:
-        logging.info(f"Converting video: {input_path}")
+        with stage(timer, "quantize"):
+            _run_ffmpeg(base + [
+                "-i", input_path,
+                "-vf", f"{prefix}palettegen=stats_mode=diff:max_colors={colors or 256}",
+                "-frames:v", "1", "-update", "1", palette_path,
+            ])
+        with stage(timer, "write"):
+            _run_ffmpeg(base + [
+                "-i", input_path, "-i", palette_path,
+                "-lavfi", f"[0:v]{prefix}null[v];[v][1:v]paletteuse=diff_mode=rectangle",
+                "-loop", "0", "-f", "gif", output_path,
+            ])
+    finally:
+        os.remove(palette_path)
+
+def moviepy_video_to_gif(input_path, output_path, max_width=None, max_height=None,
+                         fps=None, max_duration=None, colors=None, scale=1.0, fps_scale=1.0,
+                         timer=None):
+    """
+    Convert a video to a GIF with MoviePy's imageio writer.
+
+    Takes the same arguments as `ffmpeg_video_to_gif`, minus the binary.
+    MoviePy decodes, quantizes and encodes frame by frame inside
+    `write_gif`, so the timer only separates "probe" from "write".
+    """
+    # Imported here because moviepy.editor takes seconds to load and is only
+    # needed once a video actually has to be converted
+    from moviepy.editor import VideoFileClip
+
+    with stage(timer, "probe"):
         clip = VideoFileClip(input_path)
-        clip.write_gif(output_path)
+    try:
+        output = clip
+        if max_duration and clip.duration > max_duration:
+            output = output.subclip(0, max_duration)
+        size = fit_size(clip.w, clip.h, max_width, max_height, scale)
+        if size != (clip.w, clip.h):
+            # Resize with Pillow directly: MoviePy 1.x's resize() relies on
+            # Image.ANTIALIAS, which Pillow 10 removed
+            import numpy
+
+            output = output.fl_image(
+                lambda frame: numpy.asarray(Image.fromarray(frame).resize(size, Image.Resampling.LANCZOS))
+            )
+        with stage(timer, "write"):
+            # No progress bar: several workers share one stderr
+            output.write_gif(output_path, fps=fit_fps(clip.fps, fps, fps_scale),
+                             colors=colors or 256, verbose=False, logger=None)
+    finally:
+        # Release the ffmpeg reader so long-lived workers don't leak it
+        clip.close()
+
+def convert_video_to_gif(input_path, output_path, backend=DEFAULT_VIDEO_BACKEND, max_width=None,
+                         max_height=None, fps=None, max_duration=None, colors=None, max_bytes=None,
+                         timer=None):
+    """
+    Convert a video file (.mp4, .webm, .mov) to a GIF.
+
+    Args:
+        input_path (str): Full path to the input video file.
+        output_path (str): Full path to the output GIF file.
+        backend (str): "ffmpeg" for the bundled ffmpeg palette pipeline or
+            "moviepy" for MoviePy. The ffmpeg backend falls back to MoviePy
+            when no ffmpeg binary can be found.
+        max_width (int): Largest output width; the aspect ratio is kept.
+        max_height (int): Largest output height.
+        fps (float): Frame rate cap. Defaults to the source frame rate.
+        max_duration (float): Only convert the first this many seconds.
+        colors (int): Palette size, up to 256.
+        max_bytes (int): Size budget; see `fit_to_budget`.
+        timer (StageTimer): Collects per-stage timings.
+    """
+    if backend not in VIDEO_BACKENDS:
+        raise ValueError(f"Unknown video backend: {backend}")
+
+    try:
+        logging.info(f"Converting video ({backend}): {input_path}")
+        ffmpeg_exe = get_ffmpeg_exe() if backend == "ffmpeg" else None
+        if ffmpeg_exe:
+            write = functools.partial(ffmpeg_video_to_gif, ffmpeg_exe)
+        else:
+            write = moviepy_video_to_gif
+        write = functools.partial(write, input_path, output_path, max_width=max_width,
+                                  max_height=max_height, fps=fps, max_duration=max_duration,
+                                  timer=timer)
+        fit_to_budget(write, output_path, max_bytes, colors)
         logging.info(f"Saved GIF: {output_path}")
     except Exception as e:
         logging.error(f"Error converting {input_path}: {e}")
+        raise
+
+def _build_palette(im, n_frames, samples, colors, reserve_transparent, timer=None):
+    """
+    Build one palette for the whole animation from evenly spaced sample frames.
+    """
+    count = min(samples, n_frames)
+    indexes = sorted({round(i * (n_frames - 1) / max(count - 1, 1)) for i in range(count)})
 
-def convert_webp_to_gif(input_path, output_path):
+    # Shrink samples so the montage stays small however large the frames are
+    tile_w = min(im.width, 256)
+    tile_h = max(1, round(im.height * tile_w / im.width))
+    montage = Image.new("RGB", (tile_w, tile_h * len(indexes)))
+    for row, index in enumerate(indexes):
+        with stage(timer, "decode"):
+            im.seek(index)
+            im.load()
+        with stage(timer, "quantize"):
+            tile = im.convert("RGB").resize((tile_w, tile_h), Image.Resampling.BILINEAR)
+            montage.paste(tile, (0, row * tile_h))
+    im.seek(0)
+
+    colors = min(colors, 255 if reserve_transparent else 256)
+    with stage(timer, "quantize"):
+        return montage.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+
+def _quantize_frame(frame, palette, transparent_index, size):
+    """
+    Map a frame onto the shared palette. Returns (frame, has_transparent_pixels).
+    """
+    rgba = frame.convert("RGBA")
+    if rgba.size != size:
+        rgba = rgba.resize(size, Image.Resampling.LANCZOS)
+    quantized = rgba.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+    if transparent_index is None:
+        return quantized, False
+
+    mask = rgba.getchannel("A").point(lambda a: 255 if a < 128 else 0)
+    if not mask.getbbox():
+        return quantized, False
+    quantized.paste(transparent_index, mask=mask)
+    return quantized, True
+
+def animated_webp_to_gif(im, output_path, max_width=None, max_height=None, fps=None,
+                         max_duration=None, colors=None, scale=1.0, fps_scale=1.0,
+                         max_memory_mb=DEFAULT_WEBP_MAX_MEMORY_MB,
+                         palette_samples=DEFAULT_WEBP_PALETTE_SAMPLES, timer=None):
+    """
+    Write an animated image as a GIF with one shared palette and bounded memory.
+
+    Every frame is mapped onto a palette built from sampled frames instead of
+    being quantized on its own, and consecutive frames that come out identical
+    are merged into one longer frame. Pillow's GIF writer then crops each
+    frame to the region that changed since the previous one.
+
+    Only 8-bit palette frames are kept until the GIF is written. If a
+    `max_memory_mb` budget is given and even those would exceed it, only
+    one frame in n is kept and the dropped frames' time is added to the
+    kept ones. Frame rate caps drop frames the same way.
+
+    Args:
+        im (PIL.Image.Image): Opened animated image.
+        output_path (str): Full path to the output GIF file.
+        max_width (int): Largest output width; the aspect ratio is kept.
+        max_height (int): Largest output height.
+        fps (float): Frame rate cap.
+        max_duration (float): Only convert the first this many seconds.
+        colors (int): Palette size, up to 256.
+        scale (float): Extra size factor, used by the byte-budget search.
+        fps_scale (float): Extra frame rate factor, used by the byte-budget search.
+        max_memory_mb (int): Memory budget for held frames, in megabytes;
+            None keeps every frame.
+        palette_samples (int): Number of frames sampled to build the palette.
+        timer (StageTimer): Records "decode", "quantize" and "write" times.
+    """
+    n_frames = im.n_frames
+    size = fit_size(im.width, im.height, max_width, max_height, scale)
+
+    # Pillow's GIF writer keeps its own copy of every frame while saving
+    held_bytes_per_frame = size[0] * size[1] * 2
+    stride = 1
+    if max_memory_mb:
+        max_frames = max(1, (max_memory_mb * 1024 * 1024) // held_bytes_per_frame)
+        stride = -(-n_frames // max_frames)
+    if stride > 1:
+        logging.warning(f"Keeping 1 frame in {stride} of {n_frames} to stay within {max_memory_mb} MB")
+
+    # Frames are only dropped for a frame rate cap or the byte-budget search.
+    # Each frame's own duration stands in for the source rate, so a kept
+    # frame covers max(duration, cap) / fps_scale, as `fit_fps` would give.
+    throttle = bool(fps) or fps_scale < 1
+    cap_interval = 1000 / fps if fps else 0
+    end_time = max_duration * 1000 if max_duration else None
+
+    transparent_index = 255 if im.mode in ("RGBA", "LA", "PA") else None
+    palette = _build_palette(im, n_frames, palette_samples, colors or 256, transparent_index is not None, timer)
+
+    frames = []
+    durations = []
+    previous_data = None
+    has_transparency = False
+    time_ms = next_keep = 0
+    for index in range(n_frames):
+        if end_time is not None and time_ms >= end_time:
+            break
+        with stage(timer, "decode"):
+            im.seek(index)
+            im.load()
+        duration = im.info.get("duration", 100)
+        if end_time is not None:
+            duration = min(duration, end_time - time_ms)
+        time_ms += duration
+
+        start_ms = time_ms - duration
+        if frames and (index % stride or (throttle and start_ms < next_keep)):
+            durations[-1] += duration
+            continue
+        next_keep = start_ms + max(duration, cap_interval) / fps_scale
+
+        with stage(timer, "quantize"):
+            frame, transparent = _quantize_frame(im, palette, transparent_index, size)
+            frame_data = frame.tobytes()
+        has_transparency = has_transparency or transparent
+        if frame_data == previous_data:
+            durations[-1] += duration
+            continue
+
+        frames.append(frame)
+        durations.append(duration)
+        previous_data = frame_data
+
+    save_kwargs = {"save_all": True, "append_images": frames[1:], "duration": durations,
+                   "loop": im.info.get("loop", 0)}
+    if has_transparency:
+        # Restore to background so pixels can turn transparent again
+        save_kwargs.update(transparency=transparent_index, disposal=2)
+    with stage(timer, "write"):
+        frames[0].save(output_path, format="GIF", **save_kwargs)
+
+def static_webp_to_gif(im, output_path, max_width=None, max_height=None, colors=None,
+                       scale=1.0, fps_scale=1.0, timer=None):
+    """
+    Write a single-frame image as a GIF, resized to the given limits.
+
+    `fps_scale` is accepted for the byte-budget search and ignored.
+    """
+    with stage(timer, "decode"):
+        im.load()
+    size = fit_size(im.width, im.height, max_width, max_height, scale)
+    if size != im.size:
+        im = im.resize(size, Image.Resampling.LANCZOS)
+    if colors and colors < 256:
+        # Pillow can only quantize RGBA with the octree method
+        method = Image.Quantize.FASTOCTREE if im.mode == "RGBA" else Image.Quantize.MEDIANCUT
+        with stage(timer, "quantize"):
+            im = im.quantize(colors=colors, method=method)
+    with stage(timer, "write"):
+        im.save(output_path, format="GIF")
+
+def convert_webp_to_gif(input_path, output_path, max_width=None, max_height=None, fps=None,
+                        max_duration=None, colors=None, max_bytes=None,
+                        max_memory_mb=DEFAULT_WEBP_MAX_MEMORY_MB,
+                        palette_samples=DEFAULT_WEBP_PALETTE_SAMPLES, timer=None):
     """
     Convert a static or animated WEBP to a GIF using Pillow.
 
+    Static images are saved directly; animated ones go through
+    `animated_webp_to_gif`.
+
     Args:
         input_path (str): Full path to the input WEBP file.
         output_path (str): Full path to the output GIF file.
+        max_width (int): Largest output width; the aspect ratio is kept.
+        max_height (int): Largest output height.
+        fps (float): Frame rate cap for animations.
+        max_duration (float): Only convert the first this many seconds.
+        colors (int): Palette size, up to 256.
+        max_bytes (int): Size budget; see `fit_to_budget`.
+        max_memory_mb (int): Memory budget for the frames of one animation;
+            None keeps every frame.
+        palette_samples (int): Number of frames sampled to build the palette.
+        timer (StageTimer): Collects per-stage timings.
     """
     try:
         logging.info(f"Converting WEBP: {input_path}")
-        with Image.open(input_path) as im:
-            im.save(output_path, format="GIF", save_all=True)
+        with stage(timer, "probe"):
+            im = Image.open(input_path)
+        with im:
+            if getattr(im, "is_animated", False):
+                write = functools.partial(animated_webp_to_gif, im, output_path, fps=fps,
+                                          max_duration=max_duration, max_memory_mb=max_memory_mb,
+                                          palette_samples=palette_samples, timer=timer)
+            else:
+                write = functools.partial(static_webp_to_gif, im, output_path, timer=timer)
+            fit_to_budget(functools.partial(write, max_width=max_width, max_height=max_height),
+                          output_path, max_bytes, colors)
         logging.info(f"Saved GIF: {output_path}")
     except Exception as e:
         logging.error(f"Error converting {input_path}: {e}")
-
-
+        raise
@@ -0,0 +1,122 @@
+# copier.py
+
+import errno
+import logging
+import os
+import shutil
+import sys
+
+COPY_MODES = ("auto", "reflink", "hardlink", "copy")
+DEFAULT_COPY_MODE = "auto"
+
+# ioctl request number for FICLONE on Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def same_filesystem(src, dst):
+    """
+    Return True if `src` and the folder `dst` will be written to share a device.
+    """
+    try:
+        dst_dir = os.path.dirname(os.path.abspath(dst))
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def reflink(src, dst):
+    """
+    Clone `src` to `dst` with FICLONE so both share data blocks (copy-on-write).
+
+    Raises:
+        OSError: If the platform or filesystem doesn't support cloning.
+    """
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink is only supported on Linux")
+
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def kernel_copy(src, dst):
+    """
+    Copy file contents without passing them through Python buffers.
+
+    Uses `os.copy_file_range` where available (which may itself reflink or
+    do a server-side copy) and otherwise `shutil.copyfile`, which already
+    uses `sendfile`/`fcopyfile` on Linux and macOS.
+    """
+    if not hasattr(os, "copy_file_range"):
+        shutil.copyfile(src, dst)
+        return
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL, errno.EPERM):
+                raise
+    shutil.copyfile(src, dst)
+
+
+def copy_file(src, dst, mode=DEFAULT_COPY_MODE):
+    """
+    Copy an image into the output folder, avoiding a data copy where possible.
+
+    Modes:
+        "auto": reflink when on the same filesystem, else a kernel copy.
+        "reflink": like "auto", but logs when cloning is not possible.
+        "hardlink": hard-link when on the same filesystem, else a kernel copy.
+            The output then *is* the input, so editing one changes both.
+        "copy": always a kernel copy.
+
+    Copies keep the source's timestamps and permissions like `shutil.copy2`.
+
+    Args:
+        src (str): Full path to the input file.
+        dst (str): Full path to the output file. Replaced if it exists.
+        mode (str): One of `COPY_MODES`.
+
+    Returns:
+        str: The method actually used: "hardlink", "reflink" or "copy".
+    """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Unknown copy mode: {mode}")
+
+    if os.path.lexists(dst):
+        if mode == "hardlink" and os.path.exists(dst) and os.path.samefile(src, dst):
+            return "hardlink"
+        # Never write through an existing output: it may be a hard link to a source
+        os.remove(dst)
+
+    same_fs = mode != "copy" and same_filesystem(src, dst)
+
+    if mode == "hardlink" and same_fs:
+        os.link(src, dst)
+        return "hardlink"
+
+    if mode in ("auto", "reflink") and same_fs:
+        try:
+            reflink(src, dst)
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError as e:
+            if mode == "reflink":
+                logging.info(f"Reflink not possible for {src}, copying instead: {e}")
+
+    elif mode in ("hardlink", "reflink"):
+        logging.info(f"{src} is on another filesystem, copying instead of {mode}")
+
+    kernel_copy(src, dst)
+    shutil.copystat(src, dst)
+    return "copy"
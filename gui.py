@@ -2,10 +2,15 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
 import logging
+import queue
+import threading
 import time
-import shutil
 from tkinter import ttk
-from converter import convert_video_to_gif, convert_webp_to_gif
+from converter import DEFAULT_VIDEO_BACKEND, VIDEO_BACKENDS
+from manifest import Manifest
+from metrics import EtaEstimator, MetricsWriter
+from profiles import DEFAULT_PROFILE, PROFILES, build_convert_options
+from scheduler import DEFAULT_COPY_WORKERS, plan_jobs, read_ahead, run_jobs, scan_files
 
 # Logging setup
 logging.basicConfig(
@@ -20,7 +25,14 @@ output_folder = "output"
 gif_prefix = "newgif"
 image_prefix = "newimage"
 prefix_file = "prefix.txt"
+profile_name = DEFAULT_PROFILE
+profile_file = "profile.txt"
+worker_count = os.cpu_count() or 1
 cancel_requested = False
+manifest = None
+metrics_writer = None
+scan_stats = {}
+result_queue = queue.Queue()
 
 def load_prefix():
     global gif_prefix
@@ -32,6 +44,18 @@ def save_prefix():
     with open(prefix_file, "w") as f:
         f.write(gif_prefix)
 
+def load_profile():
+    global profile_name
+    if os.path.exists(profile_file):
+        with open(profile_file, "r") as f:
+            name = f.read().strip()
+        if name in PROFILES:
+            profile_name = name
+
+def save_profile():
+    with open(profile_file, "w") as f:
+        f.write(profile_name)
+
 def select_input_folder():
     global input_folder
     folder = filedialog.askdirectory()
@@ -54,13 +78,15 @@ def cancel_conversion():
     progress_label.config(text="Cancelling...")
 
 def run_conversion():
-    global gif_prefix, cancel_requested
+    global gif_prefix, profile_name, cancel_requested, manifest, metrics_writer
     cancel_requested = False
     start_total = time.perf_counter()
 
     prefix = prefix_entry.get().strip()
     gif_prefix = prefix if prefix else "newgif"
     save_prefix()
+    profile_name = profile_var.get()
+    save_profile()
 
     if not os.path.isdir(input_folder):
         messagebox.showerror("Error", "Input folder does not exist.")
@@ -72,103 +98,130 @@ def run_conversion():
     os.makedirs(gif_output, exist_ok=True)
     os.makedirs(img_output, exist_ok=True)
 
-    supported_video_exts = {"mp4", "webm", "mov"}
-    supported_image_exts = {"jpg", "jpeg", "png"}
-    gif_count = image_count = 1
-    gif_durations = []
+    manifest = Manifest(output_folder)
+    metrics_writer = MetricsWriter(output_folder)
+    convert_options = build_convert_options(profile_name, backend_var.get())
 
-    file_list = []
-    for root, _, files in os.walk(input_folder):
-        for file in files:
-            file_list.append(os.path.join(root, file))
-
-    progress_bar["maximum"] = len(file_list)
+    progress_bar["maximum"] = 1
     progress_bar["value"] = 0
-    progress_label.config(text=f"Found {len(file_list)} total files.")
-
-    for i, file_path in enumerate(file_list):
-        if cancel_requested:
-            progress_label.config(text="Conversion cancelled.")
-            logging.warning("Conversion cancelled by user.")
+    progress_label.config(text="Scanning...")
+    convert_button.config(state=tk.DISABLED)
+
+    threading.Thread(target=conversion_worker, args=(gif_output, img_output, convert_options), daemon=True).start()
+    eta = EtaEstimator(worker_count, DEFAULT_COPY_WORKERS)
+    window.after(100, poll_results, 0, eta, start_total)
+
+def conversion_worker(gif_output, img_output, convert_options):
+    """Scan, plan and feed jobs to the process pool, handing results back to the GUI thread."""
+    try:
+        file_paths = read_ahead(scan_files(input_folder, stats=scan_stats))
+        jobs = plan_jobs(file_paths, gif_output, img_output, gif_prefix, image_prefix,
+                         convert_options=convert_options, manifest=manifest)
+        for result in run_jobs(jobs, workers=worker_count, cancel=lambda: cancel_requested):
+            result_queue.put(result)
+    except Exception as e:
+        logging.error(f"Conversion pool failed: {e}")
+        result_queue.put({"job": None, "elapsed": 0, "error": str(e), "skipped": False})
+    result_queue.put(None)
+
+def poll_results(processed, eta, start_total, skipped=0):
+    while True:
+        try:
+            result = result_queue.get_nowait()
+        except queue.Empty:
+            window.after(100, poll_results, processed, eta, start_total, skipped)
             return
 
-        ext = file_path.lower().split(".")[-1]
-        try:
-            start_time = time.perf_counter()
-
-            if ext in supported_video_exts:
-                output_name = f"{gif_prefix}{str(gif_count).zfill(4)}.gif"
-                output_path = os.path.join(gif_output, output_name)
-                convert_video_to_gif(file_path, output_path)
-                gif_count += 1
-
-            elif ext == "webp":
-                output_name = f"{gif_prefix}{str(gif_count).zfill(4)}.gif"
-                output_path = os.path.join(gif_output, output_name)
-                convert_webp_to_gif(file_path, output_path)
-                gif_count += 1
-
-            elif ext in supported_image_exts:
-                output_name = f"{image_prefix}{str(image_count).zfill(4)}.{ext}"
-                output_path = os.path.join(img_output, output_name)
-                shutil.copy2(file_path, output_path)
-                image_count += 1
-
-            elapsed = time.perf_counter() - start_time
-            gif_durations.append(elapsed)
-            avg_duration = sum(gif_durations) / len(gif_durations) if gif_durations else 0
-            eta = round(avg_duration * (len(file_list) - i - 1))
-
-            progress_label.config(
-                text=f"Processed {i+1}/{len(file_list)} | ETA: {eta}s"
-            )
-            progress_bar["value"] = i + 1
-            window.update_idletasks()
-        except Exception as e:
-            logging.error(f"Error processing {file_path}: {e}")
-            progress_label.config(text=f"Error: {os.path.basename(file_path)}")
-            window.update_idletasks()
+        if result is None:
+            break
+
+        processed += 1
+        metrics_writer.record(result)
+        eta.finished(result)
+        if result["error"]:
+            name = os.path.basename(result["job"]["input_path"]) if result["job"] else "worker pool"
+            progress_label.config(text=f"Error: {name}")
+            continue
+
+        if result["skipped"]:
+            skipped += 1
+        else:
+            manifest.mark_done(result["job"]["input_path"], result.get("content_hash"))
+
+        # While the scan is still running this only covers files found so far
+        discovered = scan_stats.get("discovered", 0)
+        scanning = scan_stats.get("scanning", True)
+        remaining = round(eta.eta(scan_stats.get("discovered_bytes", {})))
+        progress_label.config(
+            text=f"Discovered {discovered}{'+' if scanning else ''} | Processed {processed} "
+                 f"({skipped} skipped) | ETA: {'>' if scanning else ''}{remaining}s"
+        )
+        progress_bar["maximum"] = max(discovered, 1)
+        progress_bar["value"] = processed
+
+    manifest.close()
+    metrics_writer.close()
+    convert_button.config(state=tk.NORMAL)
+    if cancel_requested:
+        progress_label.config(text="Conversion cancelled.")
+        logging.warning("Conversion cancelled by user.")
+        return
 
     total_elapsed = time.perf_counter() - start_total
     progress_label.config(text=f"Complete in {round(total_elapsed, 2)} seconds.")
     messagebox.showinfo("Done", f"Conversion done.\nTime taken: {round(total_elapsed, 2)} seconds.")
     logging.info(f"Finished conversion in {round(total_elapsed, 2)} seconds")
 
-# GUI setup
-window = tk.Tk()
-window.title("Media File Processor")
-window.geometry("520x360")
-window.resizable(False, False)
-
-load_prefix()
-
-input_label = tk.Label(window, text=f"Input: {input_folder}")
-input_label.pack(pady=5)
-tk.Button(window, text="Select Input Folder", command=select_input_folder).pack()
-
-output_label = tk.Label(window, text=f"Output: {output_folder}")
-output_label.pack(pady=5)
-tk.Button(window, text="Select Output Folder", command=select_output_folder).pack()
-
-prefix_frame = tk.Frame(window)
-prefix_frame.pack(pady=5)
-tk.Label(prefix_frame, text="Filename Prefix:").pack(side=tk.LEFT)
-prefix_entry = tk.Entry(prefix_frame)
-prefix_entry.insert(0, gif_prefix)
-prefix_entry.pack(side=tk.LEFT)
-
-progress_bar = ttk.Progressbar(window, orient="horizontal", length=400, mode="determinate")
-progress_bar.pack(pady=10)
-
-progress_label = tk.Label(window, text="", fg="blue")
-progress_label.pack()
-
-btn_frame = tk.Frame(window)
-btn_frame.pack(pady=10)
-tk.Button(btn_frame, text="Convert Files", command=run_conversion, bg="green", fg="white", width=15).grid(row=0, column=0, padx=10)
-tk.Button(btn_frame, text="Cancel", command=cancel_conversion, bg="red", fg="white", width=15).grid(row=0, column=1, padx=10)
+def build_window():
+    """Create the main window. Kept out of module scope so worker processes can import this module."""
+    global window, input_label, output_label, prefix_entry, profile_var, backend_var, progress_bar, progress_label, convert_button
+
+    window = tk.Tk()
+    window.title("Media File Processor")
+    window.geometry("520x390")
+    window.resizable(False, False)
+
+    load_prefix()
+    load_profile()
+
+    input_label = tk.Label(window, text=f"Input: {input_folder}")
+    input_label.pack(pady=5)
+    tk.Button(window, text="Select Input Folder", command=select_input_folder).pack()
+
+    output_label = tk.Label(window, text=f"Output: {output_folder}")
+    output_label.pack(pady=5)
+    tk.Button(window, text="Select Output Folder", command=select_output_folder).pack()
+
+    prefix_frame = tk.Frame(window)
+    prefix_frame.pack(pady=5)
+    tk.Label(prefix_frame, text="Filename Prefix:").pack(side=tk.LEFT)
+    prefix_entry = tk.Entry(prefix_frame)
+    prefix_entry.insert(0, gif_prefix)
+    prefix_entry.pack(side=tk.LEFT)
+    tk.Label(prefix_frame, text="Profile:").pack(side=tk.LEFT, padx=(10, 0))
+    profile_var = tk.StringVar(value=profile_name)
+    tk.OptionMenu(prefix_frame, profile_var, *PROFILES).pack(side=tk.LEFT)
+
+    backend_frame = tk.Frame(window)
+    backend_frame.pack(pady=5)
+    tk.Label(backend_frame, text="Video Backend:").pack(side=tk.LEFT)
+    backend_var = tk.StringVar(value=DEFAULT_VIDEO_BACKEND)
+    tk.OptionMenu(backend_frame, backend_var, *VIDEO_BACKENDS).pack(side=tk.LEFT)
+
+    progress_bar = ttk.Progressbar(window, orient="horizontal", length=400, mode="determinate")
+    progress_bar.pack(pady=10)
+
+    progress_label = tk.Label(window, text="", fg="blue")
+    progress_label.pack()
+
+    btn_frame = tk.Frame(window)
+    btn_frame.pack(pady=10)
+    convert_button = tk.Button(btn_frame, text="Convert Files", command=run_conversion, bg="green", fg="white", width=15)
+    convert_button.grid(row=0, column=0, padx=10)
+    tk.Button(btn_frame, text="Cancel", command=cancel_conversion, bg="red", fg="white", width=15).grid(row=0, column=1, padx=10)
 
 def launch_gui():
+    build_window()
     window.mainloop()
 
 if __name__ == "__main__":
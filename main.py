@@ -1,5 +1,16 @@
 # main.py
 
-from gui import launch_gui
+import sys
 
-launch_gui()
+if __name__ == "__main__":
+    # Any command-line arguments select the headless mode, which never
+    # imports tkinter. Imports stay inside the guard so worker processes
+    # re-importing this module don't open a window.
+    if len(sys.argv) > 1:
+        from cli import main
+
+        sys.exit(main())
+
+    from gui import launch_gui
+
+    launch_gui()
@@ -0,0 +1,244 @@
+# manifest.py
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+MANIFEST_NAME = ".conversion_manifest.sqlite3"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Commit at least this often so a crash loses little finished work
+COMMIT_EVERY_ROWS = 200
+COMMIT_EVERY_SECONDS = 2.0
+
+
+def hash_file(path):
+    """
+    Return the BLAKE2b hex digest of a file's contents.
+
+    Args:
+        path (str): File to hash.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def options_fingerprint(options):
+    """
+    Return a short digest of a job's converter options, so outputs made with
+    other settings (profile, backend, copy mode) are not mistaken for current.
+
+    Options set to None mean "no limit", the same as leaving them out.
+
+    Args:
+        options (dict): Keyword arguments passed to the converter, with
+            defaults filled in.
+    """
+    effective = {key: value for key, value in options.items() if value is not None}
+    encoded = json.dumps(effective, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+class Manifest:
+    """
+    Persistent record of what earlier runs produced, stored in the output folder.
+
+    Each source path maps to its size, mtime, content hash, the fingerprint
+    of the settings it was converted with and the output file made from it.
+    The content hash is empty until someone needs it or the job finishes.
+    Rows are written as "pending" when a job is planned and marked "done"
+    once it finishes, so a cancelled or crashed run resumes with the same
+    output names and only redoes unfinished work. Running counters per
+    output category and prefix make numbering continue across runs.
+    """
+
+    def __init__(self, output_folder):
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._last_commit = time.monotonic()
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                source_path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                options_hash TEXT NOT NULL DEFAULT '',
+                output_path TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS files_hash ON files (content_hash, kind);
+            CREATE INDEX IF NOT EXISTS files_size ON files (size);
+            CREATE INDEX IF NOT EXISTS files_output ON files (output_path);
+            CREATE TABLE IF NOT EXISTS counters (
+                category TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                next_number INTEGER NOT NULL,
+                PRIMARY KEY (category, prefix)
+            );
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(files)")}
+        if "options_hash" not in columns:
+            # Manifests from before settings were tracked: every row gets an
+            # empty fingerprint, so its file is redone once with known settings
+            self._db.execute("ALTER TABLE files ADD COLUMN options_hash TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+
+    def lookup(self, source_path):
+        """
+        Return the row for `source_path` as a dict, or None if never seen.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, content_hash, kind, options_hash, output_path, done"
+                " FROM files WHERE source_path = ?",
+                (source_path,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("size", "mtime_ns", "content_hash", "kind", "options_hash", "output_path", "done")
+        return dict(zip(keys, row))
+
+    def find_output(self, content_hash, kind, options_hash):
+        """
+        Return an existing finished output for the same content and settings, or None.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT output_path FROM files"
+                " WHERE content_hash = ? AND kind = ? AND options_hash = ? AND done = 1",
+                (content_hash, kind, options_hash),
+            ).fetchall()
+        for (output_path,) in rows:
+            if os.path.exists(output_path):
+                return output_path
+        return None
+
+    def has_size(self, size, kind, options_hash):
+        """
+        Return True if a finished, hashed row has this size, i.e. a file of
+        `size` bytes could be a renamed copy of converted content.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM files WHERE size = ? AND kind = ? AND options_hash = ?"
+                " AND content_hash != '' AND done = 1 LIMIT 1",
+                (size, kind, options_hash),
+            ).fetchone()
+        return row is not None
+
+    def output_shared(self, source_path, output_path):
+        """
+        Return True if a row other than `source_path`'s points at `output_path`.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM files WHERE output_path = ? AND source_path != ? LIMIT 1",
+                (output_path, source_path),
+            ).fetchone()
+        return row is not None
+
+    def next_number(self, category, prefix, output_dir):
+        """
+        Reserve and return the next running number for `category`/`prefix`.
+
+        The first time a prefix is seen the counter starts after the highest
+        number already present in `output_dir`, so files from runs made before
+        the manifest existed are not overwritten.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT next_number FROM counters WHERE category = ? AND prefix = ?",
+                (category, prefix),
+            ).fetchone()
+            number = row[0] if row else _highest_existing(output_dir, prefix) + 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO counters (category, prefix, next_number) VALUES (?, ?, ?)",
+                (category, prefix, number + 1),
+            )
+            self._changed()
+        return number
+
+    def record(self, source_path, size, mtime_ns, content_hash, kind, options_hash, output_path,
+               done=False):
+        """
+        Insert or replace the row for `source_path`.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files"
+                " (source_path, size, mtime_ns, content_hash, kind, options_hash, output_path, done)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source_path, size, mtime_ns, content_hash, kind, options_hash, output_path, int(done)),
+            )
+            self._changed()
+
+    def set_hash(self, source_path, content_hash):
+        """
+        Fill in the content hash of a row recorded without one.
+        """
+        with self._lock:
+            self._db.execute("UPDATE files SET content_hash = ? WHERE source_path = ?",
+                             (content_hash, source_path))
+            self._changed()
+
+    def mark_done(self, source_path, content_hash=None):
+        """
+        Mark the job for `source_path` as finished, storing the content hash
+        the worker computed if planning didn't.
+        """
+        with self._lock:
+            if content_hash:
+                self._db.execute("UPDATE files SET done = 1, content_hash = ? WHERE source_path = ?",
+                                 (content_hash, source_path))
+            else:
+                self._db.execute("UPDATE files SET done = 1 WHERE source_path = ?", (source_path,))
+            self._changed()
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
+
+    def _changed(self):
+        self._dirty += 1
+        if (self._dirty >= COMMIT_EVERY_ROWS
+                or time.monotonic() - self._last_commit >= COMMIT_EVERY_SECONDS):
+            self._commit()
+
+    def _commit(self):
+        self._db.commit()
+        self._dirty = 0
+        self._last_commit = time.monotonic()
+
+
+def _highest_existing(output_dir, prefix):
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d+)\.[^.]+$")
+    highest = 0
+    if os.path.isdir(output_dir):
+        for name in os.listdir(output_dir):
+            match = pattern.match(name)
+            if match:
+                highest = max(highest, int(match.group(1)))
+    if highest:
+        logging.info(f"Continuing numbering after existing {prefix}{str(highest).zfill(4)} in {output_dir}")
+    return highest
@@ -0,0 +1,200 @@
+# metrics.py
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_JSONL = "metrics.jsonl"
+METRICS_PROM = "metrics.prom"
+
+
+class StageTimer:
+    """
+    Accumulates wall time per named stage (probe, decode, quantize, write, copy,
+    hash) for a single job.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def stage(timer, name):
+    """
+    Time a block under `name` if a `StageTimer` was given, otherwise do nothing.
+    """
+    return timer.stage(name) if timer is not None else contextlib.nullcontext()
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of this process or its largest child
+    (e.g. ffmpeg), in bytes. None where the platform can't report it.
+
+    The value is a high-water mark for the whole process lifetime, so in a
+    pool worker it covers every job the worker has run so far.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsWriter:
+    """
+    Writes one JSON line per finished job to `metrics.jsonl` and, on close,
+    Prometheus text-format counters to `metrics.prom` (suitable for the
+    node_exporter textfile collector).
+    """
+
+    def __init__(self, output_folder):
+        os.makedirs(output_folder, exist_ok=True)
+        self.jsonl_path = os.path.join(output_folder, METRICS_JSONL)
+        self.prom_path = os.path.join(output_folder, METRICS_PROM)
+        self._file = open(self.jsonl_path, "a", encoding="utf-8")
+        self._files = {}
+        self._bytes = {}
+        self._stage_seconds = {}
+        self._peak_rss = 0
+
+    def record(self, result):
+        """
+        Append a result from `run_jobs` and add it to the running totals.
+        """
+        job = result["job"]
+        if job is None:
+            return
+        status = "error" if result["error"] else "skipped" if result["skipped"] else "ok"
+        kind = job["kind"]
+        ext = os.path.splitext(job["input_path"])[1][1:].lower()
+        stages = result.get("stages", {})
+
+        self._file.write(json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "kind": kind,
+            "format": ext,
+            "status": status,
+            "input_path": job["input_path"],
+            "output_path": job["output_path"],
+            "elapsed": round(result["elapsed"], 6),
+            "stages": {name: round(seconds, 6) for name, seconds in stages.items()},
+            "input_bytes": result.get("input_bytes"),
+            "output_bytes": result.get("output_bytes"),
+            "peak_rss_bytes": result.get("peak_rss_bytes"),
+            "error": result["error"],
+        }) + "\n")
+
+        key = (kind, ext, status)
+        self._files[key] = self._files.get(key, 0) + 1
+        for direction in ("input", "output"):
+            count = result.get(f"{direction}_bytes") or 0
+            self._bytes[(kind, ext, direction)] = self._bytes.get((kind, ext, direction), 0) + count
+        for name, seconds in stages.items():
+            self._stage_seconds[(kind, name)] = self._stage_seconds.get((kind, name), 0.0) + seconds
+        self._peak_rss = max(self._peak_rss, result.get("peak_rss_bytes") or 0)
+
+    def close(self):
+        self._file.close()
+        lines = [
+            "# HELP converter_files_total Files handled, by job kind, input format and status.",
+            "# TYPE converter_files_total counter",
+        ]
+        for (kind, ext, status), count in sorted(self._files.items()):
+            lines.append(f'converter_files_total{{kind="{kind}",format="{ext}",status="{status}"}} {count}')
+        lines += [
+            "# HELP converter_bytes_total Bytes read and written, by job kind and input format.",
+            "# TYPE converter_bytes_total counter",
+        ]
+        for (kind, ext, direction), count in sorted(self._bytes.items()):
+            lines.append(f'converter_bytes_total{{kind="{kind}",format="{ext}",direction="{direction}"}} {count}')
+        lines += [
+            "# HELP converter_stage_seconds_total Worker time spent per stage.",
+            "# TYPE converter_stage_seconds_total counter",
+        ]
+        for (kind, name), seconds in sorted(self._stage_seconds.items()):
+            lines.append(f'converter_stage_seconds_total{{kind="{kind}",stage="{name}"}} {round(seconds, 6)}')
+        lines += [
+            "# HELP converter_worker_peak_rss_bytes Highest peak RSS reported by any worker.",
+            "# TYPE converter_worker_peak_rss_bytes gauge",
+            f"converter_worker_peak_rss_bytes {self._peak_rss}",
+        ]
+
+        # Write-then-rename so a scraper never sees a half-written file
+        tmp_path = self.prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prom_path)
+        logging.info(f"Wrote metrics to {self.jsonl_path} and {self.prom_path}")
+
+
+class EtaEstimator:
+    """
+    Estimates time remaining from separate rolling rates per job kind.
+
+    Each kind keeps an exponentially weighted average of worker seconds per
+    input byte, so one slow video doesn't skew the estimate for image copies.
+    Remaining bytes per kind are divided by the workers serving that kind;
+    GIF conversions and copies run side by side, so the slower side wins.
+    """
+
+    def __init__(self, workers, copy_workers, smoothing=0.2):
+        self.parallelism = {"video": workers, "webp": workers, "copy": copy_workers}
+        self.smoothing = smoothing
+        self.seconds_per_byte = {}
+        self.done_bytes = {}
+
+    def finished(self, result):
+        """
+        Account for a result from `run_jobs`.
+        """
+        job = result["job"]
+        if job is None:
+            return
+        kind = job["kind"]
+        size = result.get("input_bytes") or 0
+        self.done_bytes[kind] = self.done_bytes.get(kind, 0) + size
+        if result["skipped"] or result["error"] or not size:
+            return
+        rate = result["elapsed"] / size
+        previous = self.seconds_per_byte.get(kind)
+        self.seconds_per_byte[kind] = rate if previous is None else (
+            previous + self.smoothing * (rate - previous)
+        )
+
+    def eta(self, discovered_bytes):
+        """
+        Return the estimated seconds left for the files discovered so far.
+
+        Args:
+            discovered_bytes (dict): Input bytes found so far, per job kind.
+        """
+        gif_seconds = copy_seconds = 0.0
+        for kind, total in discovered_bytes.items():
+            remaining = max(total - self.done_bytes.get(kind, 0), 0)
+            rate = self.seconds_per_byte.get(kind)
+            if rate is None:
+                continue
+            seconds = remaining * rate / max(self.parallelism.get(kind, 1), 1)
+            if kind == "copy":
+                copy_seconds += seconds
+            else:
+                gif_seconds += seconds
+        return max(gif_seconds, copy_seconds)
@@ -0,0 +1,57 @@
+# profiles.py
+
+from converter import DEFAULT_VIDEO_BACKEND, DEFAULT_WEBP_MAX_MEMORY_MB
+from copier import DEFAULT_COPY_MODE
+
+# Limits applied to every generated GIF. None means "no limit / same as source".
+#   max_width, max_height: largest output size in pixels (aspect ratio is kept)
+#   fps: frame rate cap
+#   max_duration: seconds of the source that are converted
+#   colors: palette size
+#   max_bytes: size budget; settings are lowered step by step until the GIF fits
+PROFILES = {
+    "original": {},
+    "high": {"max_width": 1280, "max_height": 1280, "fps": 30, "colors": 256},
+    "web": {"max_width": 640, "max_height": 640, "fps": 15, "max_duration": 30, "colors": 256,
+            "max_bytes": 10 * 1024 * 1024},
+    "chat": {"max_width": 480, "max_height": 480, "fps": 12, "max_duration": 15, "colors": 128,
+             "max_bytes": 4 * 1024 * 1024},
+    "thumbnail": {"max_width": 240, "max_height": 240, "fps": 10, "max_duration": 6, "colors": 64,
+                  "max_bytes": 1024 * 1024},
+}
+DEFAULT_PROFILE = "original"
+PROFILE_KEYS = ("max_width", "max_height", "fps", "max_duration", "colors", "max_bytes")
+
+
+def get_profile(name):
+    """
+    Return the converter settings for a named profile.
+
+    Args:
+        name (str): One of `PROFILES`.
+
+    Returns:
+        dict: Keyword arguments accepted by `convert_video_to_gif` and
+        `convert_webp_to_gif`.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile: {name}")
+    return {key: PROFILES[name][key] for key in PROFILE_KEYS if PROFILES[name].get(key) is not None}
+
+
+def build_convert_options(profile_name=DEFAULT_PROFILE, backend=DEFAULT_VIDEO_BACKEND,
+                          webp_max_memory_mb=DEFAULT_WEBP_MAX_MEMORY_MB, copy_mode=DEFAULT_COPY_MODE):
+    """
+    Return the per-kind `convert_options` for `plan_jobs`.
+
+    The CLI and the GUI both build their options here, so the same settings
+    give the same options and the manifest doesn't redo files when a run
+    from one follows a run from the other.
+    """
+    profile = get_profile(profile_name)
+    return {
+        "video": {"backend": backend, **profile},
+        "webp": {"max_memory_mb": webp_max_memory_mb, **profile},
+        "copy": {"mode": copy_mode},
+    }
+
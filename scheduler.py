@@ -0,0 +1,513 @@
+# scheduler.py
+
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from converter import (DEFAULT_VIDEO_BACKEND, DEFAULT_WEBP_MAX_MEMORY_MB, DEFAULT_WEBP_PALETTE_SAMPLES,
+                       convert_video_to_gif, convert_webp_to_gif)
+from copier import DEFAULT_COPY_MODE, copy_file
+from manifest import hash_file, options_fingerprint
+from metrics import StageTimer, peak_rss_bytes
+
+SUPPORTED_VIDEO_EXTS = {"mp4", "webm", "mov"}
+SUPPORTED_IMAGE_EXTS = {"jpg", "jpeg", "png"}
+ALL_EXTS = SUPPORTED_VIDEO_EXTS | SUPPORTED_IMAGE_EXTS | {"webp"}
+JOB_KINDS = {
+    **{ext: "video" for ext in SUPPORTED_VIDEO_EXTS},
+    "webp": "webp",
+    **{ext: "copy" for ext in SUPPORTED_IMAGE_EXTS},
+}
+
+# Converter defaults per job kind, filled in before options are fingerprinted
+# so that leaving an option out and passing its default count as the same
+DEFAULT_OPTIONS = {
+    "video": {"backend": DEFAULT_VIDEO_BACKEND},
+    "webp": {"max_memory_mb": DEFAULT_WEBP_MAX_MEMORY_MB, "palette_samples": DEFAULT_WEBP_PALETTE_SAMPLES},
+    "copy": {"mode": DEFAULT_COPY_MODE},
+}
+
+# The pool is replaced after this many jobs per worker so that memory held
+# on to by MoviePy/ffmpeg decodes is handed back to the OS instead of piling up.
+DEFAULT_MAX_TASKS_PER_CHILD = 8
+
+# Copies are I/O bound and run on threads alongside the GIF workers
+DEFAULT_COPY_WORKERS = 4
+
+
+def scan_files(input_folder, extensions=None, stats=None):
+    """
+    Yield supported files below `input_folder` as they are found.
+
+    Walks with `os.scandir` in the same top-down order as `os.walk`, so
+    numbering is unchanged, but filters by extension during the walk and
+    never builds the full file list.
+
+    Args:
+        input_folder (str): Folder to scan recursively.
+        extensions (set): Lower-case extensions to yield. Defaults to every
+            supported extension.
+        stats (dict): Updated in place with the running "discovered" count,
+            "discovered_bytes" per job kind and "scanning" (False once the
+            walk is finished).
+    """
+    extensions = ALL_EXTS if extensions is None else extensions
+    if stats is not None:
+        stats.update(discovered=0, discovered_bytes={}, scanning=True)
+
+    stack = [input_folder]
+    try:
+        while stack:
+            folder = stack.pop()
+            subfolders = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            # Like os.walk, list symlinked folders but don't descend into them
+                            if not entry.is_symlink():
+                                subfolders.append(entry.path)
+                            continue
+                        ext = os.path.splitext(entry.name)[1][1:].lower()
+                        if ext in extensions:
+                            if stats is not None:
+                                _count_discovered(stats, entry, JOB_KINDS.get(ext))
+                            yield entry.path
+            except OSError as e:
+                logging.error(f"Error scanning {folder}: {e}")
+            stack.extend(reversed(subfolders))
+    finally:
+        if stats is not None:
+            stats["scanning"] = False
+
+
+def _count_discovered(stats, entry, kind):
+    try:
+        size = entry.stat().st_size
+    except OSError:
+        size = 0
+    stats["discovered"] += 1
+    stats["discovered_bytes"][kind] = stats["discovered_bytes"].get(kind, 0) + size
+
+
+def read_ahead(iterable, maxsize=10000):
+    """
+    Iterate `iterable` on a background thread, buffering up to `maxsize` items.
+
+    Lets directory discovery run ahead of the conversion loop without
+    holding more than `maxsize` paths in memory.
+    """
+    buffer = queue.Queue(maxsize)
+    stop = threading.Event()
+    finished = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            logging.error(f"Error while scanning: {e}")
+        finally:
+            put(finished)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is finished:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def plan_jobs(file_paths, gif_output, img_output, gif_prefix, image_prefix="newimage",
+              formats=None, convert_options=None, manifest=None):
+    """
+    Turn file paths into conversion/copy jobs with their output names.
+
+    Numbers are assigned here, in the order the paths are given, so that
+    `newgif0001` always belongs to the first video/WEBP in walk order no
+    matter which worker finishes first. Unsupported files are skipped.
+
+    With a manifest, numbering continues from earlier runs and files that
+    were already converted with the same options (unchanged, or renamed
+    copies of converted content) are yielded with a "skip" reason instead
+    of being redone. Files converted with other options are redone under
+    their existing output name.
+
+    Planning only hashes a new file when another file has the same size,
+    since only then can it be a copy; otherwise the job is flagged with
+    "hash_input" and the worker hashes it, off the dispatch path.
+
+    Args:
+        file_paths (iterable): Input file paths in walk order.
+        gif_output (str): Folder for generated GIFs.
+        img_output (str): Folder for copied images.
+        gif_prefix (str): Filename prefix for GIFs.
+        image_prefix (str): Filename prefix for copied images.
+        formats (set): Lower-case extensions to process. Defaults to every
+            supported extension.
+        convert_options (dict): Extra keyword arguments for the converter,
+            keyed by job kind, e.g. {"video": {"backend": "moviepy"}}.
+        manifest (Manifest): Record of earlier runs in the output folder.
+
+    Yields:
+        dict: Job with "kind", "input_path", "output_path", "options",
+        "skip" (None, "unchanged" or "duplicate") and "hash_input" keys.
+    """
+    convert_options = convert_options or {}
+    counters = {"gif": 1, "image": 1}
+    planned = {"hashes": {}, "sizes": set(), "unhashed": {}}
+    for file_path in file_paths:
+        ext = os.path.splitext(file_path)[1][1:].lower()
+        if formats is not None and ext not in formats:
+            continue
+
+        kind = JOB_KINDS.get(ext)
+        if kind in ("video", "webp"):
+            category, prefix, output_dir, output_ext = "gif", gif_prefix, gif_output, "gif"
+
+        elif kind == "copy":
+            category, prefix, output_dir, output_ext = "image", image_prefix, img_output, ext
+
+        else:
+            continue
+
+        options = convert_options.get(kind, {})
+        skip = None
+        hash_input = False
+        if manifest is None:
+            number = counters[category]
+            counters[category] += 1
+            output_path = os.path.join(output_dir, f"{prefix}{str(number).zfill(4)}.{output_ext}")
+        else:
+            try:
+                output_path, skip, hash_input = _plan_with_manifest(
+                    manifest, file_path, kind, options_fingerprint({**DEFAULT_OPTIONS[kind], **options}),
+                    category, prefix, output_dir, output_ext, planned
+                )
+            except OSError as e:
+                logging.error(f"Error reading {file_path}: {e}")
+                continue
+
+        yield {
+            "kind": kind,
+            "input_path": file_path,
+            "output_path": output_path,
+            "options": options,
+            "skip": skip,
+            "hash_input": hash_input,
+        }
+
+
+def _plan_with_manifest(manifest, file_path, kind, options_hash, category, prefix, output_dir,
+                        output_ext, planned):
+    st = os.stat(file_path)
+    entry = manifest.lookup(file_path)
+    size_key = (st.st_size, kind, options_hash)
+
+    content_hash = ""
+    source_changed = entry is not None and (
+        (entry["size"], entry["mtime_ns"]) != (st.st_size, st.st_mtime_ns)
+    )
+    if entry and not source_changed:
+        if (entry["done"] and entry["options_hash"] == options_hash
+                and os.path.exists(entry["output_path"])):
+            return entry["output_path"], "unchanged", False
+        # Never finished, or made with other settings: redo it under its name
+        content_hash = entry["content_hash"]
+
+    # Only a file of the same size can have the same content, so most new
+    # files are left for the worker to hash
+    if not content_hash and (size_key in planned["sizes"] or manifest.has_size(*size_key)):
+        content_hash = hash_file(file_path)
+        _hash_planned(manifest, planned, size_key)
+
+    if content_hash:
+        # Same content already queued this run under another path. Left pending
+        # so the next run confirms it once the first copy has actually finished.
+        duplicate = planned["hashes"].get((content_hash, kind, options_hash))
+        if duplicate:
+            manifest.record(file_path, st.st_size, st.st_mtime_ns, content_hash, kind, options_hash,
+                            duplicate)
+            return duplicate, "duplicate", False
+
+        # Same content converted by an earlier run, e.g. a renamed file
+        finished = manifest.find_output(content_hash, kind, options_hash)
+        if finished:
+            manifest.record(file_path, st.st_size, st.st_mtime_ns, content_hash, kind, options_hash,
+                            finished, done=True)
+            touched = entry is not None and entry["output_path"] == finished
+            return finished, "unchanged" if touched else "duplicate", False
+
+    # An edited file keeps its name unless the name is shared with a file it
+    # used to duplicate, whose output would otherwise be overwritten
+    if entry and not (source_changed and manifest.output_shared(file_path, entry["output_path"])):
+        output_path = entry["output_path"]
+    else:
+        number = manifest.next_number(category, prefix, output_dir)
+        output_path = os.path.join(output_dir, f"{prefix}{str(number).zfill(4)}.{output_ext}")
+
+    manifest.record(file_path, st.st_size, st.st_mtime_ns, content_hash, kind, options_hash, output_path)
+    planned["sizes"].add(size_key)
+    if content_hash:
+        planned["hashes"][(content_hash, kind, options_hash)] = output_path
+    else:
+        planned["unhashed"].setdefault(size_key, []).append((file_path, output_path))
+    return output_path, None, not content_hash
+
+
+def _hash_planned(manifest, planned, size_key):
+    # A same-size file turned up after these were planned unhashed
+    _, kind, options_hash = size_key
+    for file_path, output_path in planned["unhashed"].pop(size_key, []):
+        try:
+            content_hash = hash_file(file_path)
+        except OSError as e:
+            logging.error(f"Error reading {file_path}: {e}")
+            continue
+        manifest.set_hash(file_path, content_hash)
+        planned["hashes"].setdefault((content_hash, kind, options_hash), output_path)
+
+
+def run_job(job):
+    """
+    Run a single job. Executed inside a worker process (or a copy thread).
+
+    Args:
+        job (dict): Job as produced by `plan_jobs`.
+
+    Returns:
+        dict: Result with the original "job", "elapsed" seconds, "error"
+        (None on success, otherwise the error message), "skipped", per-stage
+        "stages" seconds, "input_bytes", "output_bytes", the worker's
+        "peak_rss_bytes" and, for jobs flagged "hash_input", the input's
+        "content_hash".
+    """
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    error = None
+    try:
+        if job["kind"] == "video":
+            convert_video_to_gif(job["input_path"], job["output_path"], timer=timer, **job["options"])
+        elif job["kind"] == "webp":
+            convert_webp_to_gif(job["input_path"], job["output_path"], timer=timer, **job["options"])
+        else:
+            with timer.stage("copy"):
+                copy_file(job["input_path"], job["output_path"], **job["options"])
+    except Exception as e:
+        logging.error(f"Error processing {job['input_path']}: {e}")
+        error = str(e)
+
+    content_hash = None
+    if job.get("hash_input") and not error:
+        try:
+            with timer.stage("hash"):
+                content_hash = hash_file(job["input_path"])
+        except OSError as e:
+            logging.warning(f"Could not hash {job['input_path']}: {e}")
+    return {
+        "job": job,
+        "elapsed": time.perf_counter() - start_time,
+        "error": error,
+        "skipped": False,
+        "stages": timer.stages,
+        "input_bytes": _file_size(job["input_path"]),
+        "output_bytes": None if error else _file_size(job["output_path"]),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "content_hash": content_hash,
+    }
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def _worker_died(job, error):
+    logging.error(f"Worker process died while converting {job['input_path']}: {error}")
+    return {
+        "job": job,
+        "elapsed": 0.0,
+        "error": f"Worker process died (out of memory or crashed decoder?): {error}",
+        "skipped": False,
+        "stages": {},
+        "input_bytes": _file_size(job["input_path"]),
+        "output_bytes": None,
+        "peak_rss_bytes": None,
+    }
+
+
+def _init_worker(log_file):
+    # Spawned workers start without the parent's logging configuration
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            filename=log_file,
+            level=logging.DEBUG,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+
+
+def _make_pool(workers, log_file):
+    # Not ProcessPoolExecutor(max_tasks_per_child=...): up to at least 3.13.0
+    # a retiring worker is sometimes never replaced, which hangs a 1-worker pool
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(log_file,))
+
+
+def run_jobs(jobs, workers=None, max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD,
+             cancel=None, log_file="conversion.log", copy_workers=DEFAULT_COPY_WORKERS):
+    """
+    Run jobs on a process pool and yield results as workers finish.
+
+    Jobs are pulled from `jobs` lazily and only a small window is kept in
+    flight, so very large trees never sit in the pool's queue all at once.
+    Jobs marked with a "skip" reason are yielded straight back as skipped.
+    Copy jobs run on a separate thread pool so they never wait behind, or
+    take a process away from, GIF conversions.
+
+    After `workers * max_tasks_per_child` GIF jobs the pool is left to
+    finish what it holds and is then replaced with fresh processes. New
+    and old workers never overlap, which bounds memory but leaves cores
+    idle while the slowest job of the old pool finishes; copy jobs keep
+    flowing meanwhile, and GIF jobs read during that time wait in order.
+
+    If a worker process is killed (e.g. out of memory or a crashing codec),
+    every job the pool held fails with it, so a new pool takes over the
+    remaining jobs and the affected ones are retried one at a time in a
+    separate single-worker pool (one process on top of `workers`). Only a
+    job that kills that worker while running alone is reported as an error.
+
+    Args:
+        jobs (iterable): Jobs as produced by `plan_jobs`.
+        workers (int): Number of worker processes. Defaults to the CPU count.
+        max_tasks_per_child (int): Jobs per worker before the pool is
+            replaced. 0 or None keeps workers alive for the whole run.
+        cancel (callable): Checked between results; when it returns True no
+            new jobs are started and queued ones are dropped.
+        log_file (str): Log file for the worker processes.
+        copy_workers (int): Number of threads for copy jobs.
+
+    Yields:
+        dict: Results as returned by `run_job`, in completion order.
+    """
+    workers = workers or os.cpu_count() or 1
+    copy_workers = copy_workers or 1
+    jobs = iter(jobs)
+    recycle_after = workers * max_tasks_per_child if max_tasks_per_child else None
+    window = (workers + copy_workers) * 2
+    pending = {}
+    exhausted = False
+    # GIF jobs waiting for the pool to be replaced, in walk order
+    held = collections.deque()
+    # Jobs caught in a broken pool, retried alone in `isolation_pool`
+    suspects = collections.deque()
+    isolation_pool = isolation_future = None
+
+    pool = _make_pool(workers, log_file)
+    pool_jobs = 0
+    pool_futures = set()
+    copy_pool = ThreadPoolExecutor(max_workers=copy_workers, thread_name_prefix="copy")
+
+    def new_pool():
+        nonlocal pool, pool_jobs
+        pool.shutdown(wait=False)
+        pool = _make_pool(workers, log_file)
+        pool_jobs = 0
+        pool_futures.clear()
+
+    def submit(job):
+        nonlocal pool_jobs
+        try:
+            future = pool.submit(run_job, job)
+        except BrokenProcessPool:
+            logging.error("A worker process died, starting a new pool.")
+            new_pool()
+            future = pool.submit(run_job, job)
+        pending[future] = job
+        pool_jobs += 1
+        pool_futures.add(future)
+
+    def submit_held():
+        while held:
+            if recycle_after and pool_jobs >= recycle_after:
+                if pool_futures:
+                    # Start fresh processes only once the old ones are done
+                    return
+                new_pool()
+            submit(held.popleft())
+
+    try:
+        while True:
+            if suspects and isolation_future is None:
+                isolation_pool = isolation_pool or _make_pool(1, log_file)
+                job = suspects.popleft()
+                isolation_future = isolation_pool.submit(run_job, job)
+                pending[isolation_future] = job
+
+            while not exhausted and len(pending) < window and len(held) < window:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                if job.get("skip"):
+                    yield {"job": job, "elapsed": 0.0, "error": None, "skipped": True,
+                           "input_bytes": _file_size(job["input_path"])}
+                    continue
+                if job["kind"] == "copy":
+                    pending[copy_pool.submit(run_job, job)] = job
+                    continue
+                held.append(job)
+                submit_held()
+            submit_held()
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                pool_futures.discard(future)
+                isolated = future is isolation_future
+                if isolated:
+                    isolation_future = None
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    if not isolated:
+                        suspects.append(job)
+                        continue
+                    isolation_pool.shutdown(wait=False)
+                    isolation_pool = None
+                    result = _worker_died(job, e)
+                yield result
+
+            if cancel and cancel():
+                logging.warning("Cancelling queued jobs.")
+                break
+    finally:
+        copy_pool.shutdown(wait=True, cancel_futures=True)
+        pool.shutdown(wait=True, cancel_futures=True)
+        if isolation_pool:
+            isolation_pool.shutdown(wait=True, cancel_futures=True)
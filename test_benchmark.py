@@ -0,0 +1,47 @@
+# test_benchmark.py
+
+import statistics
+
+from benchmark import compare_reports
+
+
+def report(**scenarios):
+    """Build a report from name=seconds or name=[seconds of every run]."""
+    results = []
+    for name, runs in scenarios.items():
+        runs = runs if isinstance(runs, list) else [runs]
+        results.append({"name": name, "wall_seconds": statistics.median(runs), "wall_seconds_all": runs,
+                        "peak_rss_bytes": 50 * 1024 * 1024})
+    return {"results": results}
+
+
+def test_slower_scenarios_past_the_tolerance_are_regressions(capsys):
+    baseline = report(video=10.0, webp=10.0, copy=10.0)
+    current = report(video=12.0, webp=10.5, copy=8.0)
+
+    assert compare_reports(baseline, current, tolerance=0.1) == ["video"]
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_short_scenarios_need_the_minimum_delta():
+    baseline = report(tiny=0.05, small=1.0)
+    current = report(tiny=0.2, small=1.3)
+
+    # tiny tripled but only by 0.15 s
+    assert compare_reports(baseline, current, tolerance=0.1) == ["small"]
+    assert compare_reports(baseline, current, tolerance=0.1, min_delta=0.5) == []
+
+
+def test_changes_within_the_baseline_spread_are_noise():
+    baseline = report(noisy=[4.0, 4.4, 5.2], steady=[4.0, 4.2])
+    current = report(noisy=5.0, steady=5.0)
+
+    assert compare_reports(baseline, current, tolerance=0.1) == ["steady"]
+
+
+def test_new_and_dropped_scenarios_are_not_regressions(capsys):
+    baseline = report(old=1.0)
+    current = report(new=100.0)
+
+    assert compare_reports(baseline, current, tolerance=0.1) == []
+    assert "new" in capsys.readouterr().out
@@ -0,0 +1,168 @@
+# test_converter.py
+
+import subprocess
+
+import pytest
+from PIL import Image
+
+import converter
+
+BANNER = """\
+Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'clip.mp4':
+  Duration: 00:00:02.00, start: 0.000000, bitrate: 1043 kb/s
+  Stream #0:0[0x1](und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s (default)
+  Stream #0:1[0x2](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 1920x1080, 900 kb/s, \
+29.97 fps, 29.97 tbr, 30k tbn (default)
+    Metadata:
+      handler_name    : VideoHandler
+{rotation}\
+  Stream #0:2[0x3](und): Data: none (rtmd / 0x646D7472), 0 kb/s
+    Side data:
+      displaymatrix: rotation of -90.00 degrees
+At least one output file must be specified
+"""
+
+
+def fake_ffmpeg(monkeypatch, banner):
+    def run(args, stdout=None, stderr=None):
+        return subprocess.CompletedProcess(args, 1, stderr=banner.encode())
+    monkeypatch.setattr(converter.subprocess, "run", run)
+
+
+@pytest.mark.parametrize("rotation, size", [
+    ("", (1920, 1080)),
+    ("    Side data:\n      displaymatrix: rotation of -90.00 degrees\n", (1080, 1920)),
+    ("    Side data:\n      displaymatrix: rotation of 180.00 degrees\n", (1920, 1080)),
+    ("      rotate          : 270\n", (1080, 1920)),
+])
+def test_probe_video_reports_the_displayed_size(monkeypatch, rotation, size):
+    fake_ffmpeg(monkeypatch, BANNER.format(rotation=rotation))
+
+    # The data stream's rotation must not be taken for the video's
+    assert converter.probe_video("ffmpeg", "clip.mp4") == (*size, 29.97)
+
+
+def test_probe_video_falls_back_to_tbr_and_then_25_fps(monkeypatch):
+    fake_ffmpeg(monkeypatch, "  Stream #0:0: Video: vp9, yuv420p(tv), 640x480, 24 tbr, 1k tbn\n")
+    assert converter.probe_video("ffmpeg", "clip.webm") == (640, 480, 24.0)
+
+    fake_ffmpeg(monkeypatch, "  Stream #0:0: Video: gif, bgra, 320x240\n")
+    assert converter.probe_video("ffmpeg", "clip.mov") == (320, 240, 25.0)
+
+
+def test_probe_video_without_a_video_stream_raises(monkeypatch):
+    fake_ffmpeg(monkeypatch, "  Stream #0:0: Audio: mp3, 44100 Hz, stereo, fltp, 128 kb/s\n")
+    with pytest.raises(RuntimeError, match="no video stream"):
+        converter.probe_video("ffmpeg", "song.mp4")
+
+
+# Far enough apart that every frame keeps its own palette entry
+COLORS = [(r, g, b) for r in (0, 255) for g in (0, 128, 255) for b in (0, 255)]
+
+
+def make_webp(path, colors, duration, size=(64, 48)):
+    frames = [Image.new("RGB", size, color) for color in colors]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=duration, lossless=True)
+    return str(path)
+
+
+def read_gif(path):
+    """Return the (colour, duration) of every frame of a GIF."""
+    frames = []
+    with Image.open(path) as im:
+        for index in range(im.n_frames):
+            im.seek(index)
+            frames.append((im.convert("RGB").getpixel((0, 0)), im.info["duration"]))
+    return frames
+
+
+def test_webp_keeps_every_frame_by_default(tmp_path):
+    source = make_webp(tmp_path / "in.webp", COLORS, 20)
+    converter.convert_webp_to_gif(source, str(tmp_path / "out.gif"))
+
+    assert read_gif(tmp_path / "out.gif") == [(color, 20) for color in COLORS]
+
+
+def test_webp_frame_rate_cap_merges_dropped_frames_into_kept_ones(tmp_path):
+    source = make_webp(tmp_path / "in.webp", COLORS, 20)
+    converter.convert_webp_to_gif(source, str(tmp_path / "out.gif"), fps=25)
+
+    assert read_gif(tmp_path / "out.gif") == [(color, 40) for color in COLORS[::2]]
+
+
+def test_webp_identical_frames_are_merged(tmp_path):
+    # Different in the source, the same once reduced to two colours
+    source = make_webp(tmp_path / "in.webp", [(255, 0, 0), (250, 0, 0), (0, 0, 255)], 100)
+    converter.convert_webp_to_gif(source, str(tmp_path / "out.gif"), colors=2)
+
+    assert [duration for _, duration in read_gif(tmp_path / "out.gif")] == [200, 100]
+
+
+def test_webp_max_duration_cuts_the_animation(tmp_path):
+    source = make_webp(tmp_path / "in.webp", COLORS, 20)
+    converter.convert_webp_to_gif(source, str(tmp_path / "out.gif"), max_duration=0.1)
+
+    assert read_gif(tmp_path / "out.gif") == [(color, 20) for color in COLORS[:5]]
+
+
+def test_webp_memory_budget_keeps_one_frame_in_n(tmp_path, caplog):
+    # 512x512 palette frames take 0.5 MB each while the GIF is written
+    source = make_webp(tmp_path / "in.webp", COLORS, 20, size=(512, 512))
+    converter.convert_webp_to_gif(source, str(tmp_path / "out.gif"), max_memory_mb=1)
+
+    assert read_gif(tmp_path / "out.gif") == [(COLORS[0], 120), (COLORS[6], 120)]
+    assert "Keeping 1 frame in 6 of 12 to stay within 1 MB" in caplog.text
+
+
+def test_fit_size_keeps_the_aspect_ratio_and_never_upscales():
+    assert converter.fit_size(1920, 1080) == (1920, 1080)
+    assert converter.fit_size(1920, 1080, max_width=480) == (480, 270)
+    assert converter.fit_size(1080, 1920, max_width=480, max_height=480) == (270, 480)
+    assert converter.fit_size(320, 240, max_width=640) == (320, 240)
+    assert converter.fit_size(320, 240, max_width=640, scale=0.5) == (160, 120)
+    assert converter.fit_size(4000, 2, max_width=100) == (100, 1)
+
+
+def test_fit_fps_caps_then_scales():
+    assert converter.fit_fps(30) == 30
+    assert converter.fit_fps(30, fps=10) == 10
+    assert converter.fit_fps(8, fps=10) == 8
+    assert converter.fit_fps(30, fps=10, fps_scale=0.5) == 5
+
+
+def budget_writer(output_path, sizes):
+    """Return a `write` that writes the next of `sizes` bytes, and the settings it was called with."""
+    calls = []
+
+    def write(scale, fps_scale, colors):
+        calls.append((scale, fps_scale, colors))
+        with open(output_path, "wb") as f:
+            f.write(b"x" * sizes[len(calls) - 1])
+    return write, calls
+
+
+def test_fit_to_budget_without_a_budget_writes_once(tmp_path):
+    write, calls = budget_writer(tmp_path / "out.gif", [5000])
+    converter.fit_to_budget(write, str(tmp_path / "out.gif"), colors=64)
+
+    assert calls == [(1.0, 1.0, 64)]
+
+
+def test_fit_to_budget_shrinks_until_the_file_fits(tmp_path):
+    write, calls = budget_writer(tmp_path / "out.gif", [4000, 1500, 900])
+    converter.fit_to_budget(write, str(tmp_path / "out.gif"), max_bytes=1000)
+
+    assert len(calls) == 3
+    # Four times over budget: the size step stops at BUDGET_MIN_SCALE_STEP
+    assert calls[1] == pytest.approx((0.5, 0.85, 192))
+    # Just over budget: the size step is at most BUDGET_SCALE_STEP
+    assert calls[2] == pytest.approx((0.4, 0.85 ** 2, 144))
+
+
+def test_fit_to_budget_keeps_the_last_attempt(tmp_path, caplog):
+    write, calls = budget_writer(tmp_path / "out.gif", [2000] * converter.BUDGET_ATTEMPTS)
+    converter.fit_to_budget(write, str(tmp_path / "out.gif"), max_bytes=1000)
+
+    assert len(calls) == converter.BUDGET_ATTEMPTS
+    assert [colors for _, _, colors in calls] == [256, 192, 144, 108, 81, 60, 45, 33]
+    assert "keeping 2000 bytes" in caplog.text
@@ -0,0 +1,89 @@
+# test_copier.py
+
+import errno
+import os
+
+import pytest
+
+import copier
+
+
+def write(path, content, mtime=None):
+    with open(path, "wb") as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_hardlink_replaces_an_existing_output(tmp_path):
+    src = write(tmp_path / "photo.png", b"new")
+    dst = write(tmp_path / "out.png", b"old output")
+
+    assert copier.copy_file(src, dst, mode="hardlink") == "hardlink"
+    assert os.path.samefile(src, dst)
+    # Running again over the link it made is a no-op
+    assert copier.copy_file(src, dst, mode="hardlink") == "hardlink"
+    assert read(src) == b"new"
+
+
+@pytest.mark.parametrize("mode", copier.COPY_MODES)
+def test_an_output_linked_to_another_source_is_not_written_through(tmp_path, mode):
+    other = write(tmp_path / "other.png", b"other source")
+    src = write(tmp_path / "photo.png", b"photo")
+    dst = str(tmp_path / "out.png")
+    os.link(other, dst)
+
+    copier.copy_file(src, dst, mode=mode)
+
+    assert read(dst) == b"photo"
+    assert read(other) == b"other source"
+
+
+def test_hardlink_across_filesystems_copies(tmp_path, monkeypatch):
+    monkeypatch.setattr(copier, "same_filesystem", lambda src, dst: False)
+    src = write(tmp_path / "photo.png", b"photo", mtime=1_000_000)
+    dst = str(tmp_path / "out.png")
+
+    assert copier.copy_file(src, dst, mode="hardlink") == "copy"
+    assert not os.path.samefile(src, dst)
+    assert read(dst) == b"photo"
+    assert os.stat(dst).st_mtime == 1_000_000
+
+
+@pytest.mark.parametrize("mode", ["auto", "reflink"])
+def test_failed_reflink_falls_back_to_a_copy(tmp_path, monkeypatch, mode):
+    def no_reflink(src, dst):
+        raise OSError(errno.EOPNOTSUPP, "not supported")
+    monkeypatch.setattr(copier, "reflink", no_reflink)
+    src = write(tmp_path / "photo.png", b"photo", mtime=1_000_000)
+    dst = str(tmp_path / "out.png")
+
+    assert copier.copy_file(src, dst, mode=mode) == "copy"
+    assert read(dst) == b"photo"
+    assert os.stat(dst).st_mtime == 1_000_000
+
+
+def test_kernel_copy_falls_back_when_copy_file_range_fails(tmp_path, monkeypatch):
+    def cross_device(src, dst, count):
+        raise OSError(errno.EXDEV, "cross-device")
+    monkeypatch.setattr(os, "copy_file_range", cross_device, raising=False)
+    src = write(tmp_path / "photo.png", b"photo" * 1000)
+
+    copier.kernel_copy(src, str(tmp_path / "out.png"))
+    assert read(tmp_path / "out.png") == b"photo" * 1000
+
+    monkeypatch.delattr(os, "copy_file_range")
+    copier.kernel_copy(src, str(tmp_path / "out2.png"))
+    assert read(tmp_path / "out2.png") == b"photo" * 1000
+
+
+def test_unknown_copy_mode_raises(tmp_path):
+    src = write(tmp_path / "photo.png", b"photo")
+    with pytest.raises(ValueError, match="Unknown copy mode"):
+        copier.copy_file(src, str(tmp_path / "out.png"), mode="symlink")
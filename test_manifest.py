@@ -0,0 +1,190 @@
+# test_manifest.py
+
+import os
+
+from manifest import Manifest
+from profiles import build_convert_options
+from scheduler import plan_jobs, run_jobs, scan_files
+
+
+def make_tree(root, files):
+    for relative_path, content in files.items():
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+
+def plan(input_folder, output_folder, manifest=None, convert_options=None):
+    return plan_jobs(scan_files(str(input_folder)),
+                     os.path.join(output_folder, "output_gifs"),
+                     os.path.join(output_folder, "output_images"),
+                     "newgif", convert_options=convert_options, manifest=manifest)
+
+
+def convert(input_folder, output_folder, manifest=None, workers=1, copy_workers=1, limit=None):
+    """Run jobs like the CLI does; stop after `limit` results to imitate a cancelled run."""
+    os.makedirs(os.path.join(output_folder, "output_images"), exist_ok=True)
+    outputs = {}
+    results = run_jobs(plan(input_folder, output_folder, manifest), workers=workers,
+                       copy_workers=copy_workers, log_file=os.path.join(output_folder, "test.log"))
+    for count, result in enumerate(results, 1):
+        job = result["job"]
+        assert result["error"] is None
+        if manifest and not result["skipped"]:
+            manifest.mark_done(job["input_path"], result.get("content_hash"))
+        outputs[os.path.relpath(job["input_path"], input_folder)] = (
+            os.path.basename(job["output_path"]), job["skip"]
+        )
+        if count == limit:
+            results.close()
+            break
+    return outputs
+
+
+def test_scan_files_matches_os_walk_order(tmp_path):
+    make_tree(tmp_path, {
+        "b.png": b"1", "a.jpg": b"2", "notes.txt": b"3",
+        "sub/z.mp4": b"4", "sub/deeper/y.webp": b"5", "other/x.PNG": b"6",
+    })
+    expected = [
+        os.path.join(folder, name)
+        for folder, _, names in os.walk(tmp_path)
+        for name in names
+        if not name.endswith(".txt")
+    ]
+    stats = {}
+
+    assert list(scan_files(str(tmp_path), stats=stats)) == expected
+    assert stats["discovered"] == 5
+    assert stats["scanning"] is False
+
+
+def test_numbering_is_deterministic_across_worker_counts(tmp_path):
+    make_tree(tmp_path / "in", {f"dir{i % 3}/photo{i}.png": bytes([i]) * (i + 1) for i in range(12)})
+
+    single = convert(tmp_path / "in", str(tmp_path / "out1"), copy_workers=1)
+    parallel = convert(tmp_path / "in", str(tmp_path / "out4"), workers=4, copy_workers=4)
+
+    assert single == parallel
+    walk_order = [os.path.relpath(path, tmp_path / "in") for path in scan_files(str(tmp_path / "in"))]
+    assert [single[path][0] for path in walk_order] == [f"newimage{n:04}.png" for n in range(1, 13)]
+
+
+def test_resume_after_cancel_keeps_names(tmp_path):
+    make_tree(tmp_path / "in", {f"photo{i}.png": bytes([i]) * (i + 1) for i in range(6)})
+    output = str(tmp_path / "out")
+
+    manifest = Manifest(output)
+    first = convert(tmp_path / "in", output, manifest, limit=2)
+    manifest.close()
+    # Planning runs ahead of the results, so more names were reserved than finished
+    manifest = Manifest(output)
+    planned = {os.path.relpath(job["input_path"], tmp_path / "in"): os.path.basename(job["output_path"])
+               for job in plan(tmp_path / "in", output, manifest)}
+    manifest.close()
+
+    make_tree(tmp_path / "in", {"zz_new.png": b"new"})
+    manifest = Manifest(output)
+    second = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    for path, (name, _) in first.items():
+        assert second[path] == (name, "unchanged")
+    for path, name in planned.items():
+        assert second[path][0] == name
+    assert second["zz_new.png"][0] == "newimage0007.png"
+    assert sorted(os.listdir(os.path.join(output, "output_images"))) == [
+        f"newimage{n:04}.png" for n in range(1, 8)
+    ]
+
+
+def test_renamed_file_is_reported_as_duplicate(tmp_path):
+    make_tree(tmp_path / "in", {"a.png": b"aaaa", "b.png": b"bbbbbb"})
+    output = str(tmp_path / "out")
+    manifest = Manifest(output)
+    first = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    os.rename(tmp_path / "in" / "b.png", tmp_path / "in" / "renamed.png")
+    manifest = Manifest(output)
+    second = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    assert second["renamed.png"] == (first["b.png"][0], "duplicate")
+    assert second["a.png"] == (first["a.png"][0], "unchanged")
+    assert len(os.listdir(os.path.join(output, "output_images"))) == 2
+
+
+def test_same_content_twice_in_one_run_is_copied_once(tmp_path):
+    make_tree(tmp_path / "in", {"a/one.png": b"same", "b/two.png": b"same", "c/three.png": b"diff"})
+    output = str(tmp_path / "out")
+    manifest = Manifest(output)
+    outputs = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    skips = sorted(skip or "" for _, skip in outputs.values())
+    assert skips == ["", "", "duplicate"]
+    assert outputs["a/one.png"][0] == outputs["b/two.png"][0]
+    assert len(os.listdir(os.path.join(output, "output_images"))) == 2
+
+
+def test_changed_settings_redo_files_under_the_same_name(tmp_path):
+    make_tree(tmp_path / "in", {"a.png": b"aaaa", "b.png": b"bbbbbb"})
+    output = str(tmp_path / "out")
+    manifest = Manifest(output)
+    first = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    manifest = Manifest(output)
+    jobs = list(plan(tmp_path / "in", output, manifest, convert_options={"copy": {"mode": "copy"}}))
+    manifest.close()
+
+    assert [job["skip"] for job in jobs] == [None, None]
+    assert {os.path.basename(job["input_path"]): os.path.basename(job["output_path"]) for job in jobs} == {
+        path: name for path, (name, _) in first.items()
+    }
+
+
+def test_editing_a_duplicate_does_not_overwrite_the_shared_output(tmp_path):
+    make_tree(tmp_path / "in", {"a.png": b"same", "b.png": b"same"})
+    output = str(tmp_path / "out")
+    manifest = Manifest(output)
+    first = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+    shared = first["a.png"][0]
+    assert first["b.png"][0] == shared
+
+    for name in ("a.png", "b.png"):
+        make_tree(tmp_path / "in", {name: b"edited " + name.encode()})
+        manifest = Manifest(output)
+        second = convert(tmp_path / "in", output, manifest)
+        manifest.close()
+        assert second[name][1] is None
+
+    manifest = Manifest(output)
+    third = convert(tmp_path / "in", output, manifest)
+    manifest.close()
+
+    names = {third["a.png"][0], third["b.png"][0]}
+    assert len(names) == 2
+    for name in ("a.png", "b.png"):
+        with open(os.path.join(output, "output_images", third[name][0]), "rb") as f:
+            assert f.read() == b"edited " + name.encode()
+    assert all(skip == "unchanged" for _, skip in third.values())
+
+
+def test_default_options_count_as_omitted_ones(tmp_path):
+    make_tree(tmp_path / "in", {"a.png": b"aaaa", "b.webp": b"bbbbbb", "c.mp4": b"cccccccc"})
+    output = str(tmp_path / "out")
+    manifest = Manifest(output)
+    for job in plan(tmp_path / "in", output, manifest, convert_options=build_convert_options()):
+        make_tree(output, {os.path.relpath(job["output_path"], output): b"converted"})
+        manifest.mark_done(job["input_path"])
+    manifest.close()
+
+    manifest = Manifest(output)
+    jobs = list(plan(tmp_path / "in", output, manifest, convert_options={"webp": {"max_width": None}}))
+    manifest.close()
+
+    assert [job["skip"] for job in jobs] == ["unchanged"] * 3
@@ -0,0 +1,56 @@
+# test_metrics.py
+
+import pytest
+
+from metrics import EtaEstimator
+
+
+def result(kind, input_bytes, elapsed, skipped=False, error=None):
+    return {"job": {"kind": kind}, "input_bytes": input_bytes, "elapsed": elapsed,
+            "skipped": skipped, "error": error}
+
+
+def test_eta_is_zero_before_any_rate_is_known():
+    eta = EtaEstimator(workers=4, copy_workers=2)
+    assert eta.eta({"video": 10_000, "copy": 5_000}) == 0
+
+
+def test_eta_divides_remaining_bytes_by_the_workers_of_each_kind():
+    eta = EtaEstimator(workers=4, copy_workers=2)
+    eta.finished(result("video", 1000, 10.0))
+    eta.finished(result("copy", 1000, 1.0))
+
+    # Videos: 9000 bytes * 0.01 s/B / 4 workers; copies: 4000 * 0.001 / 2
+    assert eta.eta({"video": 10_000, "copy": 5_000}) == pytest.approx(22.5)
+    # Copies run beside the conversions, so the slower side decides
+    assert eta.eta({"video": 1_000, "copy": 100_000}) == pytest.approx(49.5)
+
+
+def test_gif_kinds_share_the_conversion_workers():
+    eta = EtaEstimator(workers=2, copy_workers=8)
+    eta.finished(result("video", 100, 1.0))
+    eta.finished(result("webp", 100, 2.0))
+
+    # 200 video bytes take 1 s and 200 WEBP bytes 2 s on the same two workers
+    assert eta.eta({"video": 300, "webp": 300}) == pytest.approx(3.0)
+
+
+def test_rates_are_smoothed_per_kind():
+    eta = EtaEstimator(workers=1, copy_workers=1, smoothing=0.5)
+    eta.finished(result("video", 100, 1.0))
+    eta.finished(result("video", 100, 3.0))
+    eta.finished(result("copy", 100, 0.1))
+
+    assert eta.seconds_per_byte == pytest.approx({"video": 0.02, "copy": 0.001})
+
+
+def test_skipped_and_failed_jobs_count_as_done_but_not_for_the_rate():
+    eta = EtaEstimator(workers=1, copy_workers=1)
+    eta.finished(result("video", 100, 1.0))
+    eta.finished(result("video", 500, 0.0, skipped=True))
+    eta.finished(result("video", 400, 0.5, error="boom"))
+    eta.finished({"job": None, "input_bytes": None, "elapsed": 0.0, "skipped": False, "error": "pool died"})
+
+    assert eta.seconds_per_byte == {"video": 0.01}
+    assert eta.eta({"video": 2000}) == pytest.approx(10.0)
+    assert eta.eta({"video": 500}) == 0
@@ -0,0 +1,49 @@
+# test_scheduler.py
+
+import os
+import time
+
+import scheduler
+
+
+def crash_on_bad(job):
+    if os.path.basename(job["input_path"]) == "bad.mp4":
+        os._exit(1)
+    time.sleep(0.01)
+    return {"job": job, "elapsed": 0.01, "error": None, "skipped": False, "stages": {}}
+
+
+def test_a_crashing_file_fails_only_itself(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "run_job", crash_on_bad)
+    jobs = [{"kind": "video", "input_path": f"/in/clip{i}.mp4", "output_path": f"/out/{i}.gif",
+             "options": {}, "skip": None} for i in range(60)]
+    jobs[20]["input_path"] = "/in/bad.mp4"
+
+    results = list(scheduler.run_jobs(jobs, workers=4, log_file=str(tmp_path / "test.log")))
+
+    assert len(results) == 60
+    assert [r["job"]["input_path"] for r in results if r["error"]] == ["/in/bad.mp4"]
+
+
+def sleep_for_job(job):
+    time.sleep(float(job["options"].get("sleep", 0)))
+    return {"job": job, "elapsed": 0.0, "error": None, "skipped": False, "stages": {}}
+
+
+def test_copies_keep_flowing_while_the_pool_is_recycled(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "run_job", sleep_for_job)
+    jobs = [{"kind": "video", "input_path": "/in/slow.mp4", "output_path": "", "options": {"sleep": 1.5},
+             "skip": None}]
+    jobs += [{"kind": "video", "input_path": f"/in/clip{i}.mp4", "output_path": "", "options": {},
+              "skip": None} for i in range(3)]
+    jobs += [{"kind": "copy", "input_path": f"/in/photo{i}.png", "output_path": "", "options": {},
+              "skip": None} for i in range(10)]
+
+    finished = [r["job"]["input_path"] for r in scheduler.run_jobs(
+        jobs, workers=2, max_tasks_per_child=1, copy_workers=2, log_file=str(tmp_path / "test.log")
+    )]
+
+    # The pool is due for replacement after two jobs, while slow.mp4 still runs
+    assert len(finished) == 14
+    assert finished.index("/in/photo9.png") < finished.index("/in/slow.mp4")
+    assert finished.index("/in/slow.mp4") < finished.index("/in/clip2.mp4")